@@ -0,0 +1,53 @@
+import argparse
+import json
+import sys
+
+def compare(baseline: dict, candidate: dict, tolerance: float) -> list[str]:
+    """
+    Compare the summaries of two load test reports, returning the regressions beyond tolerance:
+    a lower max sustainable rate, or a higher p99 latency at it.
+    """
+    regressions = []
+
+    print(f"{'endpoint':<24}{'max rps':>22}{'p99 ms':>22}")
+    for name, base in baseline["summary"]["endpoints"].items():
+        new = candidate["summary"]["endpoints"].get(name)
+        if new is None:
+            continue
+
+        print(f"{name:<24}{base['max_sustainable_rps']:>10} -> {new['max_sustainable_rps']:<9}"
+              f"{str(base['p99_ms']):>10} -> {str(new['p99_ms']):<9}")
+
+        if new["max_sustainable_rps"] < base["max_sustainable_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: max sustainable rps {base['max_sustainable_rps']} -> {new['max_sustainable_rps']}")
+        if base["p99_ms"] is not None and new["p99_ms"] is not None and new["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {base['p99_ms']} ms -> {new['p99_ms']} ms")
+
+    base_total = baseline["summary"]["max_sustainable_rps"]
+    new_total = candidate["summary"]["max_sustainable_rps"]
+    print(f"{'overall':<24}{base_total:>10} -> {new_total:<9}")
+    if new_total < base_total * (1 - tolerance):
+        regressions.append(f"overall: max sustainable rps {base_total} -> {new_total}")
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two load test reports, failing on regressions.")
+    parser.add_argument("baseline", help="Report of the baseline release")
+    parser.add_argument("candidate", help="Report of the release to compare")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change tolerated before reporting a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    regressions = compare(baseline, candidate, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import httpx
+
+from scenarios import TRAFFIC_MIX, Scenario, SeedData, seed
+
+# Share of the requests sent that have to be served for a step to be sustained
+MIN_THROUGHPUT_RATIO = 0.95
+
+@dataclass
+class EndpointSamples:
+    latencies: list[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies) + sum(self.errors.values())
+
+def percentile(sorted_values: list[float], fraction: float) -> float | None:
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+async def run_step(
+        client: httpx.AsyncClient,
+        seed_data: SeedData,
+        rate: float,
+        duration: float,
+        max_in_flight: int) -> dict[str, EndpointSamples]:
+    """
+    Send requests of the traffic mix at rate requests per second for duration seconds.
+
+    Load is open loop: requests are sent on a Poisson schedule whether or not earlier
+    ones have completed, and latency is measured from the scheduled send time, so a slow
+    server shows up as latency instead of as a lower request rate.
+    """
+    samples = {scenario.name: EndpointSamples() for scenario in TRAFFIC_MIX}
+    weights = [scenario.weight for scenario in TRAFFIC_MIX]
+    in_flight = set()
+
+    async def send(scenario: Scenario, scheduled_at: float):
+        try:
+            response = await scenario.request(client, seed_data)
+        except httpx.HTTPError as e:
+            samples[scenario.name].errors[type(e).__name__] += 1
+            return
+
+        if response.is_success:
+            samples[scenario.name].latencies.append(time.perf_counter() - scheduled_at)
+        else:
+            samples[scenario.name].errors[str(response.status_code)] += 1
+
+    start = time.perf_counter()
+    scheduled_at = start
+    while True:
+        scheduled_at += random.expovariate(rate)
+        if scheduled_at - start >= duration:
+            break
+
+        await asyncio.sleep(max(scheduled_at - time.perf_counter(), 0))
+
+        scenario = random.choices(TRAFFIC_MIX, weights)[0]
+        # The client refuses to pile up more requests rather than run out of sockets
+        if len(in_flight) >= max_in_flight:
+            samples[scenario.name].errors["client_saturated"] += 1
+            continue
+
+        task = asyncio.create_task(send(scenario, scheduled_at))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+    return samples
+
+def endpoint_report(scenario: Scenario, samples: EndpointSamples, duration: float) -> dict:
+    latencies = sorted(samples.latencies)
+    error_count = sum(samples.errors.values())
+    error_rate = error_count / samples.requests if samples.requests else 0.0
+
+    def milliseconds(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    p95 = percentile(latencies, 0.95)
+    p99 = percentile(latencies, 0.99)
+
+    return {
+        "requests": samples.requests,
+        "successful_rps": round(len(latencies) / duration, 2),
+        "error_rate": round(error_rate, 4),
+        "errors": dict(samples.errors),
+        "p50_ms": milliseconds(percentile(latencies, 0.50)),
+        "p95_ms": milliseconds(p95),
+        "p99_ms": milliseconds(p99),
+        "max_ms": milliseconds(latencies[-1] if latencies else None),
+        "slo_met": bool(latencies)
+            and p95 * 1000 <= scenario.p95_slo_ms
+            and p99 * 1000 <= scenario.p99_slo_ms
+            and error_rate <= scenario.max_error_rate
+    }
+
+def summarize(steps: list[dict]) -> dict:
+    """
+    Max sustainable rate overall and per endpoint: the highest step up to which the
+    latency and error objectives were met at every step, along with its latencies.
+    """
+    overall = None
+    endpoints = {}
+
+    for step in steps:
+        if not step["sustained"]:
+            break
+        overall = step
+
+    for scenario in TRAFFIC_MIX:
+        sustained = None
+        for step in steps:
+            if not step["endpoints"][scenario.name]["slo_met"]:
+                break
+            sustained = step["endpoints"][scenario.name]
+
+        endpoints[scenario.name] = {
+            "max_sustainable_rps": sustained["successful_rps"] if sustained else 0.0,
+            "p50_ms": sustained["p50_ms"] if sustained else None,
+            "p95_ms": sustained["p95_ms"] if sustained else None,
+            "p99_ms": sustained["p99_ms"] if sustained else None,
+        }
+
+    return {
+        "max_sustainable_rps": overall["achieved_rps"] if overall else 0.0,
+        "endpoints": endpoints
+    }
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+        seed_data = await seed(client, generate=not args.no_seed)
+        print(f"Seeded: {len(seed_data.charger_ids)} chargers, {len(seed_data.regions)} regions")
+
+        if args.warmup_seconds > 0:
+            await run_step(client, seed_data, args.rates[0], args.warmup_seconds, args.max_in_flight)
+
+        steps = []
+        for rate in args.rates:
+            samples = await run_step(client, seed_data, rate, args.step_seconds, args.max_in_flight)
+
+            endpoints = {
+                scenario.name: endpoint_report(scenario, samples[scenario.name], args.step_seconds)
+                for scenario in TRAFFIC_MIX
+            }
+            # Requests actually scheduled, which vary around the nominal rate
+            offered = sum(endpoint.requests for endpoint in samples.values()) / args.step_seconds
+            achieved = sum(endpoint["successful_rps"] for endpoint in endpoints.values())
+            step = {
+                "rate": rate,
+                "offered_rps": round(offered, 2),
+                "achieved_rps": round(achieved, 2),
+                "sustained": achieved >= MIN_THROUGHPUT_RATIO * offered
+                    and all(endpoint["slo_met"] for endpoint in endpoints.values()),
+                "endpoints": endpoints
+            }
+            steps.append(step)
+
+            print(f"{step['offered_rps']:>8} rps offered, {step['achieved_rps']:>8} served, "
+                  f"{'sustained' if step['sustained'] else 'NOT sustained'}")
+            if sum(not previous["sustained"] for previous in steps) >= args.stop_after_failures:
+                break
+
+    return {
+        "label": args.label,
+        "target": args.target,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "step_seconds": args.step_seconds,
+            "warmup_seconds": args.warmup_seconds,
+            "max_in_flight": args.max_in_flight,
+            "min_throughput_ratio": MIN_THROUGHPUT_RATIO,
+            "charger_count": len(seed_data.charger_ids),
+            "scenarios": [
+                {
+                    "name": scenario.name,
+                    "weight": scenario.weight,
+                    "p95_slo_ms": scenario.p95_slo_ms,
+                    "p99_slo_ms": scenario.p99_slo_ms,
+                    "max_error_rate": scenario.max_error_rate
+                } for scenario in TRAFFIC_MIX
+            ]
+        },
+        "steps": steps,
+        "summary": summarize(steps)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the service with a realistic traffic mix, at increasing request rates.")
+    parser.add_argument("--target", default="http://localhost/tou-service", help="Base URL of the service")
+    parser.add_argument("--label", default=None, help="Label of the tested release, recorded in the report")
+    parser.add_argument("--output", default="loadtest-report.json", help="Path of the JSON report")
+    parser.add_argument(
+        "--rates",
+        default="10,20,40,80,160,320,640",
+        type=lambda rates: [float(rate) for rate in rates.split(",")],
+        help="Comma separated request rates of the steps, in requests per second")
+    parser.add_argument("--step-seconds", type=float, default=30, help="Duration of each step")
+    parser.add_argument("--warmup-seconds", type=float, default=10, help="Duration of the unreported warmup, at the first rate")
+    parser.add_argument("--max-in-flight", type=int, default=512, help="Maximum number of concurrent requests")
+    parser.add_argument("--timeout", type=float, default=10, help="Request timeout in seconds")
+    parser.add_argument("--stop-after-failures", type=int, default=2, help="Stop after this many steps are not sustained")
+    parser.add_argument("--no-seed", action="store_true", help="Never generate data, even if the database has none")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report["summary"], indent=2))
+
+if __name__ == "__main__":
+    main()
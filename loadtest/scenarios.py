@@ -0,0 +1,103 @@
+import random
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+
+import httpx
+
+# Offsets applied around a charger location for nearest charger searches, in degrees (~5 km)
+SEARCH_JITTER_DEGREES = 0.05
+
+@dataclass
+class SeedData:
+    """
+    Ids and locations of the seeded data, discovered through the API, that requests are made for.
+    """
+    charger_ids: list[str] = field(default_factory=list)
+    # (longitude, latitude) of each charger
+    locations: list[tuple[float, float]] = field(default_factory=list)
+    # (name, state code) of each region
+    regions: list[tuple[str, str]] = field(default_factory=list)
+
+@dataclass
+class Scenario(ABC):
+    """
+    Endpoint of the traffic mix, with its share of the requests and its latency objectives.
+    """
+    name: str
+    weight: float
+    p95_slo_ms: float
+    p99_slo_ms: float
+    max_error_rate: float = 0.01
+
+    @abstractmethod
+    def request(self, client: httpx.AsyncClient, seed: SeedData):
+        ...
+
+class NearestChargers(Scenario):
+    def request(self, client, seed):
+        longitude, latitude = random.choice(seed.locations)
+        return client.get("/nearest-chargers", params={
+            "lat": latitude + random.uniform(-SEARCH_JITTER_DEGREES, SEARCH_JITTER_DEGREES),
+            "lon": longitude + random.uniform(-SEARCH_JITTER_DEGREES, SEARCH_JITTER_DEGREES),
+            "count": random.choice([1, 5, 10]),
+            "not_in_use_only": random.random() < 0.5
+        })
+
+class CurrentPrice(Scenario):
+    def request(self, client, seed):
+        return client.get(f"/chargers/{random.choice(seed.charger_ids)}/current-pricing-period")
+
+class PricingSchedule(Scenario):
+    def request(self, client, seed):
+        return client.get(f"/chargers/{random.choice(seed.charger_ids)}/pricing-schedule")
+
+class RegionSearch(Scenario):
+    def request(self, client, seed):
+        # A part of the name of an existing region of the state, so that searches find it
+        name, state_code = random.choice(seed.regions)
+        start = random.randrange(len(name))
+        return client.get("/regions", params={
+            "state_code": state_code,
+            "name_like": name[start:start + 4]
+        })
+
+class PriceTierUpdate(Scenario):
+    def request(self, client, seed):
+        return client.patch(
+            f"/chargers/{random.choice(seed.charger_ids)}",
+            json={"charger_price_tier": random.randint(1, 5)})
+
+# Mostly customers polling prices and looking for chargers, with occasional price setting
+TRAFFIC_MIX = [
+    NearestChargers("nearest_chargers", weight=0.35, p95_slo_ms=150, p99_slo_ms=300),
+    CurrentPrice("current_pricing_period", weight=0.30, p95_slo_ms=100, p99_slo_ms=200),
+    PricingSchedule("pricing_schedule", weight=0.15, p95_slo_ms=100, p99_slo_ms=200),
+    RegionSearch("region_search", weight=0.15, p95_slo_ms=100, p99_slo_ms=200),
+    PriceTierUpdate("price_tier_update", weight=0.05, p95_slo_ms=500, p99_slo_ms=1000),
+]
+
+async def seed(client: httpx.AsyncClient, generate: bool) -> SeedData:
+    """
+    Generate the development data set with the service's own generator if requested and
+    the database has no regions yet, as generating it again would duplicate them, then
+    discover the chargers and regions to make requests for.
+    """
+    regions = (await client.get("/regions", timeout=60)).raise_for_status().json()
+
+    if generate and not regions["contents"]:
+        response = await client.post("/init-db-dev", timeout=600)
+        response.raise_for_status()
+        regions = (await client.get("/regions", timeout=60)).raise_for_status().json()
+
+    chargers = (await client.get("/chargers", params={"operational_only": False}, timeout=60)).raise_for_status().json()
+
+    data = SeedData(
+        charger_ids=[charger["id"] for charger in chargers["contents"]],
+        locations=[tuple(charger["location"]["coordinates"]) for charger in chargers["contents"]],
+        regions=[(region["name"], region["state_code"]) for region in regions["contents"]]
+    )
+
+    if not data.charger_ids or not data.regions:
+        raise RuntimeError("No chargers or regions to load test, seed the database first")
+
+    return data
@@ -0,0 +1,27 @@
+import os
+
+def env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    
+    if value is None:
+        return default
+    
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Development mode, reporting SQL statement counts as response headers
+DEV_MODE = env_flag("DEV_MODE", False)
+
+# Coalesce concurrent identical reads of hot endpoints into a single database query
+SINGLE_FLIGHT_CHARGER = env_flag("SINGLE_FLIGHT_CHARGER", True)
+SINGLE_FLIGHT_CURRENT_PRICING_PERIOD = env_flag("SINGLE_FLIGHT_CURRENT_PRICING_PERIOD", True)
+
+# Per-request profiling, enabled by a non-empty token (sent in the X-Profile header)
+# or a non-zero sampling rate
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN") or None
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_OUTPUT_DIR = os.environ.get("PROFILING_OUTPUT_DIR", "/data/profiles")
+PROFILING_INTERVAL_MS = float(os.environ.get("PROFILING_INTERVAL_MS", "1"))
+
+# Answer nearest charger queries from an in-memory spatial index, refreshed periodically
+SPATIAL_INDEX_ENABLED = env_flag("SPATIAL_INDEX_ENABLED", False)
+SPATIAL_INDEX_REFRESH_SECONDS = float(os.environ.get("SPATIAL_INDEX_REFRESH_SECONDS", "5"))
@@ -1,6 +1,8 @@
-from shapely.geometry import Point
+from shapely.geometry import MultiPolygon, Point
 from geoalchemy2.shape import from_shape
 from app.database.models import Region, Charger, PricingPeriod, PricingPeriodStatus, ChargerPriceStatus
+from app.utils.pricing_utils import compute_price_per_kwh
+from app.region_subdivisions import refresh_region_subdivisions
 from sqlalchemy.orm import Session
 import random
 import geopandas as gpd
@@ -28,6 +30,12 @@ def generate_points_within_county(gdf, county_name, num_points):
 
     return points
 
+def county_boundary(gdf, county_name):
+    geom = gdf[gdf['NAME'] == county_name].iloc[0]["geometry"]
+    multipolygon = geom if geom.geom_type == "MultiPolygon" else MultiPolygon([geom])
+
+    return from_shape(multipolygon, srid=4326)
+
 def generate_random_price_schedule(charger: Charger, region: Region):
     num_periods = random.randint(4, 7)
 
@@ -74,10 +82,10 @@ def generate_random_price_schedule(charger: Charger, region: Region):
     for period in periods:
         start_time, end_time = period
         demand_index = random.randint(1, 5)
-        price_per_kwh = round(region.region_price_tier * 0.05 + \
-            charger.charger_price_tier * 0.02 + \
-            demand_index * 0.03,
-            2)
+        price_per_kwh = compute_price_per_kwh(
+            region.region_price_tier,
+            charger.charger_price_tier,
+            demand_index)
         
         pricing_period = PricingPeriod(
             charger_id=charger.id,
@@ -97,7 +105,9 @@ def generate_data_for_alameda_contra_costa(db: Session):
     zip_path = "/data/tl_2024_us_county.zip"
     gdf = gpd.read_file(f"zip://{zip_path}")
 
-    target_counties = gdf[gdf['NAME'].isin(["Alameda", "Contra Costa"])]
+    target_counties = gdf[gdf['NAME'].isin(["Alameda", "Contra Costa", "Maricopa"])]
+    # TIGER boundaries are in NAD83
+    target_boundaries = target_counties.to_crs(epsg=4326)
     
     # Clean up up memory
     del gdf
@@ -110,19 +120,24 @@ def generate_data_for_alameda_contra_costa(db: Session):
     region_alameda_ca = Region(
         name="Alameda County",
         state_code="CA",
-        region_price_tier=4
+        region_price_tier=4,
+        boundary=county_boundary(target_boundaries, "Alameda")
     )
     region_contra_costa_ca = Region(
         name="Contra Costa County",
         state_code="CA",
-        region_price_tier=3
+        region_price_tier=3,
+        boundary=county_boundary(target_boundaries, "Contra Costa")
     )
     region_az = Region(
         name="Maricopa County",
         state_code="AZ",
-        region_price_tier=2
+        region_price_tier=2,
+        boundary=county_boundary(target_boundaries, "Maricopa")
     )
     db.add_all([region_alameda_ca, region_contra_costa_ca, region_az])
+    db.flush()
+    refresh_region_subdivisions(db)
     db.commit()
     
     chargers = []
@@ -0,0 +1,478 @@
+import argparse
+import enum
+import io
+import os
+import uuid
+from datetime import time
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+import pytz
+import shapely
+from pyogrio import open_arrow
+from pyproj import CRS, Transformer
+from sqlalchemy import BigInteger, Boolean, Column, Float, Integer, MetaData, String, Table, any_, case, cast, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import UUID, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.database.database import SessionLocal
+from app.database.models import Charger, ChargerPriceStatus, PricingPeriod, PricingPeriodStatus, Region, RegionSubdivision
+from app.schedule_versions import reprice_schedules
+from app.schemas.data_transfer_objects import ChargerImportErrorDTO, ChargerImportResultDTO
+from app.utils.pricing_utils import price_per_kwh_expression
+from app.utils.sql_utils import uuid_array
+
+IMPORT_ROOT = "/data"
+# Number of chargers read, validated and copied to the staging table at a time
+IMPORT_CHUNK_SIZE = 50000
+# Maximum number of rejected chargers reported back in the import result
+MAX_REPORTED_ERRORS = 100
+# Demand index of the single all-day pricing period given to imported chargers without a
+# schedule, until the pricing engine derives their demand from occupancy
+DEFAULT_DEMAND_INDEX = 3
+
+class ImportFormat(enum.Enum):
+    GEOJSON = "geojson"
+    CSV = "csv"
+    SHAPEFILE = "shapefile"
+
+IMPORT_FORMAT_EXTENSIONS = {
+    ".geojson": ImportFormat.GEOJSON,
+    ".json": ImportFormat.GEOJSON,
+    ".csv": ImportFormat.CSV,
+    ".shp": ImportFormat.SHAPEFILE,
+    ".zip": ImportFormat.SHAPEFILE,
+}
+
+STAGING_COLUMNS = [
+    "row_number",
+    "id",
+    "region_id",
+    "longitude",
+    "latitude",
+    "time_zone",
+    "in_use",
+    "charger_price_tier",
+    "operational",
+]
+
+TIME_ZONES = pytz.all_timezones_set
+
+# Temporary table the chargers are copied to, before being merged into the chargers table
+staging_metadata = MetaData()
+charger_import_staging = Table(
+    "charger_import_staging",
+    staging_metadata,
+    Column("row_number", BigInteger, nullable=False),
+    Column("id", UUID(as_uuid=True), nullable=False),
+    # Assigned from the region boundaries when not provided
+    Column("region_id", UUID(as_uuid=True), nullable=True),
+    Column("longitude", Float, nullable=False),
+    Column("latitude", Float, nullable=False),
+    Column("time_zone", String, nullable=False),
+    Column("in_use", Boolean, nullable=False),
+    Column("charger_price_tier", Integer, nullable=False),
+    Column("operational", Boolean, nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+def resolve_import_path(path: str) -> str:
+    """
+    Resolve a path relative to the data directory, refusing paths outside of it.
+    """
+    root = os.path.realpath(IMPORT_ROOT)
+    resolved = os.path.realpath(os.path.join(root, path))
+
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"Import path '{path}' is outside of {IMPORT_ROOT}")
+
+    if not os.path.isfile(resolved):
+        raise ValueError(f"Import file '{path}' not found")
+
+    return resolved
+
+def detect_import_format(path: str) -> ImportFormat:
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension not in IMPORT_FORMAT_EXTENSIONS:
+        raise ValueError(f"Cannot detect import format of '{path}'")
+
+    return IMPORT_FORMAT_EXTENSIONS[extension]
+
+def _read_csv_chunks(path: str) -> Iterator[pd.DataFrame]:
+    chunks = pd.read_csv(
+        path,
+        chunksize=IMPORT_CHUNK_SIZE,
+        dtype={"id": str, "region_id": str, "time_zone": str, "in_use": str, "operational": str}
+    )
+
+    for chunk in chunks:
+        yield chunk
+
+def _read_spatial_chunks(path: str) -> Iterator[pd.DataFrame]:
+    # GDAL streams the features as Arrow record batches, with WKB encoded geometries
+    with open_arrow(path, batch_size=IMPORT_CHUNK_SIZE, use_pyarrow=True) as source:
+        meta, reader = source
+        geometry_name = meta["geometry_name"] or "wkb_geometry"
+
+        transformer = None
+        if meta["crs"] and not CRS.from_user_input(meta["crs"]).equals(CRS.from_epsg(4326)):
+            transformer = Transformer.from_crs(meta["crs"], "EPSG:4326", always_xy=True)
+
+        for batch in reader:
+            chunk = batch.to_pandas()
+            geometries = shapely.from_wkb(chunk.pop(geometry_name).to_numpy())
+
+            # Coordinates of anything but points are NaN, and rejected by validation
+            longitudes = shapely.get_x(geometries)
+            latitudes = shapely.get_y(geometries)
+            if transformer:
+                longitudes, latitudes = transformer.transform(longitudes, latitudes)
+
+            chunk["longitude"] = longitudes
+            chunk["latitude"] = latitudes
+
+            yield chunk
+
+def _read_chunks(path: str, import_format: ImportFormat) -> Iterator[pd.DataFrame]:
+    if import_format == ImportFormat.CSV:
+        return _read_csv_chunks(path)
+
+    return _read_spatial_chunks(path)
+
+def _parse_uuids(values: pd.Series) -> pd.Series:
+    def parse(value):
+        try:
+            return uuid.UUID(str(value))
+        except ValueError:
+            return None
+
+    return values.map(parse, na_action="ignore").astype(object)
+
+def _parse_booleans(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip().str.lower().map({
+        "true": True, "t": True, "1": True, "yes": True,
+        "false": False, "f": False, "0": False, "no": False,
+    })
+
+def _column(chunk: pd.DataFrame, name: str, default=None) -> pd.Series:
+    if name in chunk:
+        return chunk[name]
+
+    return pd.Series(default, index=chunk.index, dtype=object)
+
+def _validate_chunk(
+        chunk: pd.DataFrame,
+        first_row_number: int,
+        default_region_id: uuid.UUID | None) -> tuple[pd.DataFrame, list[tuple[int, str]]]:
+    """
+    Validate and normalize a chunk of chargers, vectorized over the whole chunk.
+    Returns the valid chargers as staging rows, and the rejected ones with the reason
+    they were rejected.
+    """
+    row_numbers = pd.Series(
+        np.arange(first_row_number, first_row_number + len(chunk)),
+        index=chunk.index)
+
+    longitudes = pd.to_numeric(_column(chunk, "longitude"), errors="coerce")
+    latitudes = pd.to_numeric(_column(chunk, "latitude"), errors="coerce")
+    time_zones = _column(chunk, "time_zone")
+    tiers = pd.to_numeric(_column(chunk, "charger_price_tier"), errors="coerce")
+    in_use = _parse_booleans(_column(chunk, "in_use").fillna("false"))
+    operational = _parse_booleans(_column(chunk, "operational").fillna("true"))
+
+    # Chargers without an id get a new one, chargers with an id are upserted
+    raw_ids = _column(chunk, "id")
+    ids = _parse_uuids(raw_ids)
+    missing_ids = raw_ids.isna()
+    ids[missing_ids] = [uuid.uuid4() for _ in range(missing_ids.sum())]
+
+    raw_region_ids = _column(chunk, "region_id")
+    region_ids = _parse_uuids(raw_region_ids)
+    region_ids[raw_region_ids.isna()] = default_region_id
+
+    checks = [
+        (ids.isna(), "invalid id"),
+        (~longitudes.between(-180, 180), "invalid longitude"),
+        (~latitudes.between(-90, 90), "invalid latitude"),
+        (~time_zones.isin(TIME_ZONES), "invalid time zone"),
+        (~tiers.isin([1, 2, 3, 4, 5]), "invalid charger price tier, must be an integer from 1 to 5"),
+        (in_use.isna(), "invalid in_use flag"),
+        (operational.isna(), "invalid operational flag"),
+        (region_ids.isna() & raw_region_ids.notna(), "invalid region id"),
+    ]
+
+    rejected = pd.Series(False, index=chunk.index)
+    errors = []
+    for failed, reason in checks:
+        newly_failed = failed & ~rejected
+        errors.extend((int(row_number), reason) for row_number in row_numbers[newly_failed])
+        rejected |= failed
+
+    valid = ~rejected
+    rows = pd.DataFrame({
+        "row_number": row_numbers[valid],
+        "id": ids[valid],
+        "region_id": region_ids[valid],
+        "longitude": longitudes[valid],
+        "latitude": latitudes[valid],
+        "time_zone": time_zones[valid],
+        "in_use": in_use[valid].astype(bool),
+        "charger_price_tier": tiers[valid].astype(int),
+        "operational": operational[valid].astype(bool),
+    }, columns=STAGING_COLUMNS)
+
+    return rows, errors
+
+def _copy_to_staging(db: Session, rows: pd.DataFrame):
+    buffer = io.StringIO()
+    rows.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+
+    dbapi_connection = db.connection().connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {charger_import_staging.name} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+
+def _latest_staged_chargers():
+    """
+    Staged chargers of known regions. When a charger id appears several times in the file,
+    its last row wins.
+    """
+    staging = charger_import_staging
+    return (
+        select(staging)
+        .join(Region.__table__, Region.__table__.c.id == staging.c.region_id)
+        .distinct(staging.c.id)
+        .order_by(staging.c.id, staging.c.row_number.desc())
+        .subquery("latest_staged_chargers")
+    )
+
+def _repriced_charger_ids(db: Session, staged) -> list[uuid.UUID]:
+    """
+    Ids of the existing chargers whose price tier or region is changed by the import,
+    whose schedule has to be repriced once the import is committed.
+    """
+    chargers = Charger.__table__
+    return db.scalars(
+        select(chargers.c.id)
+        .join(staged, staged.c.id == chargers.c.id)
+        .where(or_(
+            chargers.c.charger_price_tier != staged.c.charger_price_tier,
+            chargers.c.region_id != staged.c.region_id))
+    ).all()
+
+def _merge_staging(db: Session, staged) -> int:
+    """
+    Upsert the staged chargers into the chargers table in a single statement.
+    """
+    chargers = Charger.__table__
+
+    staged_chargers = select(
+        staged.c.id,
+        staged.c.region_id,
+        func.ST_SetSRID(func.ST_MakePoint(staged.c.longitude, staged.c.latitude), 4326),
+        staged.c.time_zone,
+        staged.c.in_use,
+        staged.c.charger_price_tier,
+        cast(literal(ChargerPriceStatus.UP_TO_DATE, chargers.c.price_status.type), chargers.c.price_status.type),
+        staged.c.operational,
+    )
+
+    statement = insert(chargers).from_select(
+        ["id", "region_id", "location", "time_zone", "in_use", "charger_price_tier", "price_status", "operational"],
+        staged_chargers
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[chargers.c.id],
+        set_={
+            "region_id": statement.excluded.region_id,
+            "location": statement.excluded.location,
+            "time_zone": statement.excluded.time_zone,
+            "in_use": statement.excluded.in_use,
+            "charger_price_tier": statement.excluded.charger_price_tier,
+            "operational": statement.excluded.operational,
+            "updated_at": func.now(),
+        }
+    )
+
+    return db.execute(statement).rowcount
+
+def _create_default_schedules(db: Session, staged) -> int:
+    """
+    Give the imported chargers without a pricing schedule, the new ones, a single period
+    covering the whole day at DEFAULT_DEMAND_INDEX, priced from their tiers.
+    Returns the number of chargers given a schedule.
+    """
+    periods = PricingPeriod.__table__
+    status_type = periods.c.status.type
+
+    has_schedule = select(periods.c.charger_id).where(periods.c.charger_id == Charger.id).exists()
+
+    return db.execute(
+        insert(periods).from_select(
+            ["id", "charger_id", "schedule_version", "start_time", "end_time", "demand_index", "price_per_kwh", "status"],
+            select(
+                func.gen_random_uuid(),
+                Charger.id,
+                Charger.active_schedule_version,
+                literal(time(0)),
+                literal(time(0)),
+                literal(DEFAULT_DEMAND_INDEX),
+                price_per_kwh_expression(
+                    Region.region_price_tier,
+                    Charger.charger_price_tier,
+                    literal(DEFAULT_DEMAND_INDEX)),
+                cast(literal(PricingPeriodStatus.UP_TO_DATE, status_type), status_type))
+            .join(staged, staged.c.id == Charger.id)
+            .join(Region, Region.id == Charger.region_id)
+            .where(~has_schedule)
+        )
+    ).rowcount
+
+def _assign_regions(db: Session):
+    """
+    Assign the staged chargers without a region to the region whose boundary contains them.
+    """
+    staging = charger_import_staging
+    subdivisions = RegionSubdivision.__table__
+
+    containing_region = (
+        select(subdivisions.c.region_id)
+        .where(func.ST_Intersects(
+            subdivisions.c.geometry,
+            func.ST_SetSRID(func.ST_MakePoint(staging.c.longitude, staging.c.latitude), 4326)))
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    db.execute(
+        update(staging)
+        .where(staging.c.region_id.is_(None))
+        .values(region_id=containing_region)
+    )
+
+def _unknown_region_errors(db: Session) -> tuple[int, list[tuple[int, str]]]:
+    staging = charger_import_staging
+    regions = Region.__table__
+
+    unknown_region = ~select(regions.c.id).where(regions.c.id == staging.c.region_id).exists()
+    reason = case(
+        (staging.c.region_id.is_(None), "no region contains the charger location"),
+        else_="unknown region"
+    )
+
+    count = db.execute(select(func.count()).select_from(staging).where(unknown_region)).scalar()
+    errors = db.execute(
+        select(staging.c.row_number, reason)
+        .where(unknown_region)
+        .order_by(staging.c.row_number)
+        .limit(MAX_REPORTED_ERRORS)
+    ).all()
+
+    return count, [(row_number, reason) for row_number, reason in errors]
+
+def import_chargers(
+        db: Session,
+        path: str,
+        import_format: ImportFormat | None = None,
+        default_region_id: str | None = None) -> ChargerImportResultDTO:
+    """
+    Import chargers from a GeoJSON, CSV or shapefile.
+
+    The file is streamed in chunks of IMPORT_CHUNK_SIZE chargers, which are validated and
+    copied with COPY into a temporary staging table. The staged chargers are then merged
+    into the chargers table with a single upsert, and the whole import is committed at once.
+    New chargers are given a default all-day pricing schedule in the same transaction, and
+    the schedules of existing chargers whose price tier or region changed are repriced once
+    the import is committed.
+
+    CSV files must have longitude and latitude columns, GeoJSON and shapefiles point
+    geometries. The other columns are time_zone, charger_price_tier, and optionally id,
+    region_id, in_use (default false) and operational (default true).
+    Chargers without a region_id are assigned default_region_id if provided, or else
+    the region whose boundary contains them.
+    """
+    import_format = import_format or detect_import_format(path)
+    default_region_uuid = uuid.UUID(default_region_id) if default_region_id else None
+
+    charger_import_staging.create(db.connection())
+
+    row_count = 0
+    rejected_count = 0
+    errors = []
+
+    try:
+        for chunk in _read_chunks(path, import_format):
+            rows, chunk_errors = _validate_chunk(chunk, row_count + 1, default_region_uuid)
+            row_count += len(chunk)
+            rejected_count += len(chunk_errors)
+            errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+            if len(rows):
+                _copy_to_staging(db, rows)
+
+        _assign_regions(db)
+        unknown_region_count, unknown_region_errors = _unknown_region_errors(db)
+        rejected_count += unknown_region_count
+        errors.extend(unknown_region_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+        staged = _latest_staged_chargers()
+        repriced_ids = _repriced_charger_ids(db, staged)
+        imported_count = _merge_staging(db, staged)
+        scheduled_count = _create_default_schedules(db, staged)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    repriced_count = 0
+    if repriced_ids:
+        repriced_count, _, _ = reprice_schedules(db, [Charger.id == any_(uuid_array(repriced_ids))])
+
+    result = ChargerImportResultDTO(
+        row_count=row_count,
+        imported_count=imported_count,
+        scheduled_count=scheduled_count,
+        repriced_count=repriced_count,
+        rejected_count=rejected_count,
+        errors=[
+            ChargerImportErrorDTO(row=row_number, reason=reason)
+            for row_number, reason in sorted(errors)
+        ]
+    )
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Import chargers from a GeoJSON, CSV or shapefile.")
+    parser.add_argument("path", help="Path of the file to import")
+    parser.add_argument(
+        "--format",
+        choices=[import_format.value for import_format in ImportFormat],
+        help="Format of the file, detected from its extension by default")
+    parser.add_argument(
+        "--region-id",
+        help="Region of the chargers without a region_id, instead of the region containing them")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = import_chargers(
+            db,
+            args.path,
+            ImportFormat(args.format) if args.format else None,
+            args.region_id
+        )
+    finally:
+        db.close()
+
+    print(result.model_dump_json(indent=2))
+
+if __name__ == "__main__":
+    main()
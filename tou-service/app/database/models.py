@@ -3,7 +3,7 @@ from datetime import datetime, time
 from typing import Annotated
 import enum
 
-from sqlalchemy import ForeignKey, Enum
+from sqlalchemy import DDL, DateTime, ForeignKey, Enum, Index, Sequence, SmallInteger, and_, event, func
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 from sqlalchemy.dialects.postgresql import UUID
 from geoalchemy2 import Geometry
@@ -12,8 +12,14 @@ from shapely.geometry import Point
 
 from .database import Base
 
+# Versions of the pricing schedules staged by repricing, increasing across all chargers.
+# Schedules created along with their charger are version 1.
+schedule_version_seq = Sequence("schedule_version_seq", start=2, metadata=Base.metadata)
+
 class ChargerPriceStatus(enum.Enum):
     UP_TO_DATE = "up_to_date"
+    # Only set through PATCH /chargers, by operators flagging prices under review. Repricing
+    # does not use it, as new schedules are published atomically, and reads ignore it.
     PENDING = "pending"
 
 class PricingPeriodStatus(enum.Enum):
@@ -33,6 +39,30 @@ class Region(Base):
     state_code: Mapped[str] = mapped_column(nullable=False)
     # 1 to 5
     region_price_tier: Mapped[int] = mapped_column(nullable=False)
+    # None if the boundary of the region is unknown
+    boundary: Mapped[object | None] = mapped_column(
+        Geometry(geometry_type="MULTIPOLYGON", srid=4326),
+        nullable=True
+    )
+
+class RegionSubdivision(Base):
+    """
+    Region boundary split into polygons of a bounded number of vertices (ST_Subdivide),
+    so that point in region tests stay cheap however detailed the boundary is.
+    """
+    __tablename__ = "region_subdivisions"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    region_id: Mapped[Annotated[uuid.UUID, mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("regions.id"),
+        nullable=False,
+        index=True
+    )]]
+    geometry: Mapped[object] = mapped_column(
+        Geometry(geometry_type="GEOMETRY", srid=4326),
+        nullable=False
+    )
 
 class Charger(Base):
     __tablename__ = "chargers"
@@ -58,8 +88,30 @@ class Charger(Base):
     charger_price_tier: Mapped[int] = mapped_column(nullable=False)
     price_status: Mapped[ChargerPriceStatus] = mapped_column(Enum(ChargerPriceStatus), nullable=False)
     operational: Mapped[bool] = mapped_column(nullable=False)
+    # Bumped on every update, to feed caches with the chargers changed since their last refresh
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+        index=True
+    )
 
+    # Version of the pricing schedule served, and of the schedule it replaced, kept until
+    # readers that may still have the previous version can no longer ask for it
+    active_schedule_version: Mapped[int] = mapped_column(nullable=False, default=1, server_default="1")
+    previous_schedule_version: Mapped[int | None] = mapped_column(nullable=True)
+
+    # Pricing periods of all schedule versions, for writers
     pricing_periods: Mapped[list["PricingPeriod"]] = relationship("PricingPeriod", back_populates="charger")
+    # Pricing periods of the active schedule version, for readers
+    active_pricing_periods: Mapped[list["PricingPeriod"]] = relationship(
+        "PricingPeriod",
+        primaryjoin=lambda: and_(
+            PricingPeriod.charger_id == Charger.id,
+            PricingPeriod.schedule_version == Charger.active_schedule_version),
+        viewonly=True
+    )
     
     def set_location(self, lat: float, lon: float):
         self.location = from_shape(Point(lon, lat), srid=4326)
@@ -71,6 +123,9 @@ class Charger(Base):
     
 class PricingPeriod(Base):
     __tablename__ = "pricing_periods"
+    __table_args__ = (
+        Index("ix_pricing_periods_charger_id_schedule_version", "charger_id", "schedule_version"),
+    )
 
     id: Mapped[Annotated[uuid.UUID, mapped_column(
         UUID(as_uuid=True),
@@ -82,6 +137,10 @@ class PricingPeriod(Base):
         ForeignKey("chargers.id"),
         nullable=False
     )]]
+    # Pricing periods of a charger's schedule are staged under a new version, then published
+    # all at once by pointing the charger's active_schedule_version at it. A period keeps its
+    # id across versions, so the id of a period of the active schedule stays valid.
+    schedule_version: Mapped[int] = mapped_column(primary_key=True, default=1, server_default="1")
     start_time: Mapped[time] = mapped_column(nullable=False)
     end_time: Mapped[time] = mapped_column(nullable=False)
     # 1 to 5
@@ -91,3 +150,45 @@ class PricingPeriod(Base):
     
     # Relationship back to the charger
     charger: Mapped["Charger"] = relationship("Charger", back_populates="pricing_periods")
+
+class ChargerOccupancyEvent(Base):
+    """
+    Append-only record of charger occupancy changes, RANGE partitioned by month of observation.
+    Monthly partitions are created on demand by app.occupancy, rows outside of them go to
+    the default partition.
+    No foreign key to chargers, so that bulk appends do not pay for a lookup per row.
+    """
+    __tablename__ = "charger_occupancy_events"
+    __table_args__ = (
+        # Events are appended in time order, a BRIN index is a few pages per partition
+        Index("ix_charger_occupancy_events_observed_at", "observed_at", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (observed_at)"},
+    )
+
+    charger_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    observed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    in_use: Mapped[bool] = mapped_column(nullable=False)
+
+event.listen(
+    ChargerOccupancyEvent.__table__,
+    "after_create",
+    DDL("CREATE TABLE charger_occupancy_events_default PARTITION OF charger_occupancy_events DEFAULT")
+)
+
+class ChargerOccupancyHourly(Base):
+    """
+    Occupancy of a charger per UTC hour, rolled up from the occupancy events.
+    Hours are only recorded while the state of the charger is known.
+    """
+    __tablename__ = "charger_occupancy_hourly"
+    __table_args__ = (
+        Index("ix_charger_occupancy_hourly_hour_start", "hour_start", postgresql_using="brin"),
+    )
+
+    charger_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    hour_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    # Seconds of the hour the charger was in use, and seconds its state was known, 0 to 3600
+    busy_seconds: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    observed_seconds: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    # State at the end of the hour, carried into the next rollup
+    ending_in_use: Mapped[bool] = mapped_column(nullable=False)
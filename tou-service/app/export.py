@@ -0,0 +1,229 @@
+import enum
+import io
+import json
+from datetime import time
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.sql import func
+
+from app.database.database import SessionLocal
+from app.database.models import Charger, PricingPeriod, PricingPeriodStatus
+from app.schemas.data_transfer_objects import GeoJSONPoint
+
+# Number of chargers fetched from the server-side cursor, and written per Parquet row group
+EXPORT_BATCH_SIZE = 5000
+
+class ExportFormat(enum.Enum):
+    GEOJSON = "geojson"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.GEOJSON: "application/geo+json",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+EXPORT_FILE_EXTENSIONS = {
+    ExportFormat.GEOJSON: "geojson",
+    ExportFormat.NDJSON: "ndjson",
+    ExportFormat.PARQUET: "parquet",
+}
+
+PRICING_PERIOD_ARROW_TYPE = pa.struct([
+    ("id", pa.string()),
+    ("start_time", pa.time64("us")),
+    ("end_time", pa.time64("us")),
+    ("demand_index", pa.int32()),
+    ("price_per_kwh", pa.float64()),
+    ("status", pa.string()),
+])
+
+CHARGER_ARROW_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("region_id", pa.string()),
+    ("longitude", pa.float64()),
+    ("latitude", pa.float64()),
+    ("time_zone", pa.string()),
+    ("in_use", pa.bool_()),
+    ("charger_price_tier", pa.int32()),
+    ("price_status", pa.string()),
+    ("operational", pa.bool_()),
+    ("pricing_periods", pa.list_(PRICING_PERIOD_ARROW_TYPE)),
+])
+
+def _export_statement(region_id: str | None):
+    # Pricing periods are aggregated per charger in the database, so each charger is a
+    # single row of the cursor, with its schedule already attached.
+    pricing_periods = (
+        select(func.coalesce(
+            func.json_agg(aggregate_order_by(
+                func.json_build_object(
+                    "id", PricingPeriod.id,
+                    "start_time", PricingPeriod.start_time,
+                    "end_time", PricingPeriod.end_time,
+                    "demand_index", PricingPeriod.demand_index,
+                    "price_per_kwh", PricingPeriod.price_per_kwh,
+                    "status", PricingPeriod.status),
+                PricingPeriod.start_time)),
+            text("'[]'::json")))
+        .where(
+            PricingPeriod.charger_id == Charger.id,
+            PricingPeriod.schedule_version == Charger.active_schedule_version)
+        .scalar_subquery()
+    )
+
+    statement = select(
+        Charger.id,
+        Charger.region_id,
+        func.ST_X(Charger.location).label("longitude"),
+        func.ST_Y(Charger.location).label("latitude"),
+        Charger.time_zone,
+        Charger.in_use,
+        Charger.charger_price_tier,
+        Charger.price_status,
+        Charger.operational,
+        pricing_periods.label("pricing_periods"),
+    )
+
+    if region_id:
+        statement = statement.where(Charger.region_id == region_id)
+
+    return statement.order_by(Charger.id)
+
+def _stream_charger_batches(region_id: str | None) -> Iterator[list[dict]]:
+    """
+    Stream chargers with their pricing schedules from a server-side cursor,
+    EXPORT_BATCH_SIZE chargers at a time.
+
+    The session is owned by the generator rather than the request, as it has to stay
+    open for as long as the response is being streamed.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            _export_statement(region_id),
+            execution_options={"yield_per": EXPORT_BATCH_SIZE}
+        )
+
+        for rows in result.partitions():
+            yield [_charger_record(row) for row in rows]
+    finally:
+        db.close()
+
+def _charger_record(row) -> dict:
+    return {
+        "id": str(row.id),
+        "region_id": str(row.region_id),
+        "longitude": row.longitude,
+        "latitude": row.latitude,
+        "time_zone": row.time_zone,
+        "in_use": row.in_use,
+        "charger_price_tier": row.charger_price_tier,
+        "price_status": row.price_status.value,
+        "operational": row.operational,
+        "pricing_periods": [
+            {
+                "id": period["id"],
+                "start_time": period["start_time"],
+                "end_time": period["end_time"],
+                "demand_index": period["demand_index"],
+                "price_per_kwh": period["price_per_kwh"],
+                # json_build_object serializes enums by name
+                "status": PricingPeriodStatus[period["status"]].value
+            } for period in row.pricing_periods
+        ]
+    }
+
+def _geojson_feature(record: dict) -> dict:
+    properties = dict(record)
+    longitude = properties.pop("longitude")
+    latitude = properties.pop("latitude")
+
+    return {
+        "type": "Feature",
+        "id": record["id"],
+        "geometry": GeoJSONPoint(coordinates=(longitude, latitude)).model_dump(),
+        "properties": properties
+    }
+
+def _stream_geojson(region_id: str | None) -> Iterator[bytes]:
+    yield b'{"type":"FeatureCollection","features":['
+
+    first = True
+    for records in _stream_charger_batches(region_id):
+        chunk = ",".join(json.dumps(_geojson_feature(record)) for record in records)
+        if not chunk:
+            continue
+        yield (chunk if first else "," + chunk).encode()
+        first = False
+
+    yield b"]}"
+
+def _stream_ndjson(region_id: str | None) -> Iterator[bytes]:
+    for records in _stream_charger_batches(region_id):
+        yield "".join(json.dumps(record) + "\n" for record in records).encode()
+
+class _ParquetStreamSink(io.RawIOBase):
+    """
+    Write-only file handed to the Parquet writer, whose written bytes can be drained as
+    they come. Positions keep counting across drains, as the writer records absolute
+    offsets of the row groups in the file footer.
+    """
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _stream_parquet(region_id: str | None) -> Iterator[bytes]:
+    # Each batch is written as one row group, and the bytes written so far are handed
+    # to the response before the next batch is fetched.
+    sink = _ParquetStreamSink()
+    writer = pq.ParquetWriter(sink, CHARGER_ARROW_SCHEMA)
+
+    try:
+        for records in _stream_charger_batches(region_id):
+            for record in records:
+                for period in record["pricing_periods"]:
+                    period["start_time"] = time.fromisoformat(period["start_time"])
+                    period["end_time"] = time.fromisoformat(period["end_time"])
+
+            writer.write_table(pa.Table.from_pylist(records, schema=CHARGER_ARROW_SCHEMA))
+            yield sink.drain()
+    finally:
+        writer.close()
+
+    yield sink.drain()
+
+def export_chargers(export_format: ExportFormat, region_id: str | None = None) -> Iterator[bytes]:
+    """
+    Export all chargers, or the chargers of a region, with their pricing schedules
+    attached, as a stream of bytes in the requested format.
+    Memory use is bounded by EXPORT_BATCH_SIZE, whatever the number of chargers.
+    """
+    if export_format == ExportFormat.GEOJSON:
+        return _stream_geojson(region_id)
+
+    if export_format == ExportFormat.NDJSON:
+        return _stream_ndjson(region_id)
+
+    return _stream_parquet(region_id)
@@ -1,15 +1,28 @@
+import uuid
+from datetime import datetime
+
 from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
 from geoalchemy2.shape import from_shape, to_shape
 from shapely.geometry import Point, mapping
 
-from app.database.database import get_db, engine, Base
+from app.database.database import get_db, engine, Base, SessionLocal
 from app.database.models import PricingPeriodStatus, Region, Charger, ChargerPriceStatus
-from app.schemas.data_transfer_objects import CreatePricingPeriodsDTO, DeletePricingPeriodsDTO, PatchChargerDTO, PricingPeriodDTO, PricingPeriodsDTO, PricingScheduleDTO, RegionDTO, RegionsDTO, ChargersDTO, ChargerDTO, UpdatePricingPeriodDTO
+from app.schemas.data_transfer_objects import ChargerEmbed, ChargersMultiGetDTO, CreatePricingPeriodsDTO, DeletePricingPeriodsDTO, PatchChargerDTO, PatchRegionDTO, PricingEngineRequestDTO, PricingEngineResultDTO, PricingPeriodDTO, PricingPeriodsDTO, PricingScheduleDTO, PricedChargersDTO, DistancedChargersDTO, ChargerImportResultDTO, OccupancyEventsDTO, OccupancyEventsResultDTO, OccupancyRollupResultDTO, RegionDTO, RegionsDTO, ChargerDTO, RepricingRequestDTO, RepricingResultDTO, SingleFlightStatsCollectionDTO, SingleFlightStatsDTO, UpdatePricingPeriodDTO, UtilizationDTO
 import app.service as service
 import app.data_gen as data_gen
+import app.export as export
+import app.data_import as data_import
+import app.occupancy as occupancy
+import app.pricing_engine as pricing_engine
+import app.config as config
+from app.utils.single_flight import SingleFlight
+from app.profiling import ProfilingMiddleware
+from app.query_counting import QueryCountMiddleware
+from app.spatial_index import charger_spatial_index
 
 # Create database tables
 Base.metadata.drop_all(bind=engine)
@@ -17,6 +30,36 @@ Base.metadata.create_all(bind=engine)
 
 fast_app = FastAPI(root_path="/tou-service")
 
+if config.DEV_MODE:
+    fast_app.add_middleware(QueryCountMiddleware)
+
+# Only installed when enabled, so that profiling costs nothing otherwise
+if config.PROFILING_TOKEN or config.PROFILING_SAMPLE_RATE > 0:
+    fast_app.add_middleware(
+        ProfilingMiddleware,
+        token=config.PROFILING_TOKEN,
+        sample_rate=config.PROFILING_SAMPLE_RATE,
+        output_dir=config.PROFILING_OUTPUT_DIR,
+        interval=config.PROFILING_INTERVAL_MS / 1000
+    )
+
+if config.SPATIAL_INDEX_ENABLED:
+    charger_spatial_index.start(config.SPATIAL_INDEX_REFRESH_SECONDS)
+
+# Concurrent identical reads of hot endpoints share a single database query
+charger_single_flight = SingleFlight("charger", config.SINGLE_FLIGHT_CHARGER)
+current_pricing_period_single_flight = SingleFlight("current-pricing-period", config.SINGLE_FLIGHT_CURRENT_PRICING_PERIOD)
+
+def with_session(fn, *args):
+    """
+    Call a service function with a session of its own, for calls shared between requests.
+    """
+    db = SessionLocal()
+    try:
+        return fn(*args, db)
+    finally:
+        db.close()
+
 @fast_app.get("/")
 async def root():
     return {"message": "tou-service is running!"}
@@ -49,6 +92,26 @@ async def init_db_dev(db: Session = Depends(get_db)):
     data_gen.generate_data_for_alameda_contra_costa(db)
     return {"message": "Database initialized with dev data!"}
     
+@fast_app.get("/single-flight/stats", tags=["Development"])
+async def get_single_flight_stats() -> SingleFlightStatsCollectionDTO:
+    """
+    Get the number of requests served and coalesced, per coalesced endpoint.
+    """
+    single_flights = [charger_single_flight, current_pricing_period_single_flight]
+    
+    return SingleFlightStatsCollectionDTO(
+        self="/single-flight/stats",
+        count=len(single_flights),
+        contents=[
+            SingleFlightStatsDTO(
+                name=single_flight.name,
+                enabled=single_flight.enabled,
+                calls=single_flight.calls,
+                coalesced=single_flight.coalesced
+            ) for single_flight in single_flights
+        ]
+    )
+
 @fast_app.get("/regions", tags=["Customer"])
 async def get_regions(
         state_code: str = Query(
@@ -62,6 +125,22 @@ async def get_regions(
     
     return result
 
+@fast_app.get("/regions/containing-point", tags=["Customer"])
+async def get_region_containing_point(
+    lat: float = Query(..., description="Latitude of the location"),
+    lon: float = Query(..., description="Longitude of the location"),
+    db: Session = Depends(get_db)
+) -> RegionDTO:
+    """
+    Get the region whose boundary contains a location.
+    """
+    result = service.get_region_containing_point(db, lat, lon)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="No region contains this location")
+    
+    return result
+
 @fast_app.get("/regions/{region_id}", tags=["Customer"])
 async def get_region(region_id: str, db: Session = Depends(get_db)) -> RegionDTO:
     result = service.get_region(region_id, db)
@@ -71,7 +150,19 @@ async def get_region(region_id: str, db: Session = Depends(get_db)) -> RegionDTO
     
     return result
 
-@fast_app.get("/chargers", tags=["Customer"])
+@fast_app.get("/regions/{region_id}/boundary", tags=["Customer"])
+async def get_region_boundary(region_id: str, db: Session = Depends(get_db)) -> dict:
+    """
+    Get the boundary of a region as a GeoJSON geometry.
+    """
+    result = service.get_region_boundary(region_id, db)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Region not found")
+    
+    return result
+
+@fast_app.get("/chargers", tags=["Customer"], response_model_exclude_none=True)
 async def get_chargers(
     operational_only: bool = Query(
         default=False,
@@ -82,7 +173,16 @@ async def get_chargers(
     region_id: str = Query(
         default=None,
         description="If provided, only return chargers in this region."),
-    db: Session = Depends(get_db)) -> ChargersDTO:
+    within_region_id: str = Query(
+        default=None,
+        description="If provided, only return chargers located within the boundary of this region."),
+    include_current_price: bool = Query(
+        default=False,
+        description="If True, include each charger's current pricing period."),
+    sort_by_price: bool = Query(
+        default=False,
+        description="If True, sort chargers by current price per kWh, chargers without a current pricing period last. Implies include_current_price."),
+    db: Session = Depends(get_db)) -> PricedChargersDTO:
     """
     Get all chargers.
     """
@@ -90,14 +190,36 @@ async def get_chargers(
         db,
         operational_only=operational_only,
         not_in_use_only=not_in_use_only,
-        region_id=region_id
+        region_id=region_id,
+        within_region_id=within_region_id,
+        include_current_price=include_current_price,
+        sort_by_price=sort_by_price
     )
     
     return result
 
+@fast_app.get("/chargers/multi", tags=["Customer"])
+async def get_chargers_by_ids(
+    ids: list[str] = Query(..., description="Ids of the chargers to return"),
+    embed: ChargerEmbed = Query(
+        default=None,
+        description="If provided, embed the current pricing period or the pricing schedule of each charger."),
+    db: Session = Depends(get_db)
+) -> ChargersMultiGetDTO:
+    """
+    Get several chargers by id in a single request.
+    Ids of chargers that do not exist are listed in not_found.
+    """
+    if len(ids) > service.MAX_MULTI_GET_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {service.MAX_MULTI_GET_IDS} charger ids can be requested at once")
+    
+    result = service.get_chargers_by_ids(db, ids, embed)
+    
+    return result
+
 @fast_app.get("/chargers/{charger_id}", tags=["Customer"])
-async def get_charger(charger_id: str, db: Session = Depends(get_db)) -> ChargerDTO:
-    result = service.get_charger(charger_id, db)
+async def get_charger(charger_id: str) -> ChargerDTO:
+    result = await charger_single_flight.run(charger_id, with_session, service.get_charger, charger_id)
     
     if not result:
         raise HTTPException(status_code=404, detail="Charger not found")
@@ -114,7 +236,7 @@ async def get_charger_pricing_schedule(charger_id: str, db: Session = Depends(ge
     return result
 
 @fast_app.get("/chargers/{charger_id}/current-pricing-period", tags=["Customer"])
-async def get_charger_current_pricing_period(charger_id: str, db: Session = Depends(get_db)) -> PricingPeriodDTO:
+async def get_charger_current_pricing_period(charger_id: str) -> PricingPeriodDTO:
     """
     Get the current pricing period for a charger.
     
@@ -122,7 +244,9 @@ async def get_charger_current_pricing_period(charger_id: str, db: Session = Depe
     it is marked as STALE.
     This endpoint assumes the requester is in the same time zone as the charger.
     """
-    result = service.get_charger_current_pricing_period(charger_id, db)
+    result = await current_pricing_period_single_flight.run(
+        charger_id,
+        with_session, service.get_charger_current_pricing_period, charger_id)
     
     if not result:
         raise HTTPException(status_code=404, detail="Charger not found")
@@ -138,22 +262,151 @@ async def get_pricing_period(pricing_period_id: str, db: Session = Depends(get_d
     
     return result
 
-@fast_app.get("/nearest-chargers", tags=["Customer"])
+@fast_app.get("/nearest-chargers", tags=["Customer"], response_model_exclude_none=True)
 async def get_nearest_chargers(
     lat: float = Query(..., description="Latitude of the location"),    
     lon: float = Query(..., description="Longitude of the location"),
     count: int = Query(..., description="Number of nearest chargers to return"),
     operational_only: bool = Query(default=True, description="If True, only return operational chargers."), 
     not_in_use_only: bool = Query(default=False, description="If True, only return chargers that are currently not in use."),
+    within_region_id: str = Query(default=None, description="If provided, only return chargers located within the boundary of this region."),
+    include_current_price: bool = Query(default=False, description="If True, include each charger's current pricing period."),
+    sort_by_price: bool = Query(default=False, description="If True, sort the nearest chargers by current price per kWh, then distance. Implies include_current_price."),
     db: Session = Depends(get_db)
-) -> ChargersDTO:
+) -> DistancedChargersDTO:
     """
     Get the nearest chargers within a specified distance.
     """
     result = service.get_nearest_chargers(
         db,
         lat, lon, count, 
-        operational_only, not_in_use_only)
+        operational_only, not_in_use_only,
+        within_region_id,
+        include_current_price, sort_by_price)
+    
+    return result
+
+@fast_app.get("/export/chargers", tags=["Bulk data"])
+async def export_chargers(
+    format: export.ExportFormat = Query(
+        default=export.ExportFormat.GEOJSON,
+        description="Export format: GeoJSON FeatureCollection, newline-delimited JSON or Parquet."),
+    region_id: str = Query(
+        default=None,
+        description="If provided, only export chargers in this region."),
+    db: Session = Depends(get_db)
+) -> StreamingResponse:
+    """
+    Stream all chargers, or the chargers of a region, with their pricing schedules attached.
+    """
+    # Validated before streaming, as errors can no longer be reported once the response has started
+    if region_id:
+        try:
+            region_id = str(uuid.UUID(region_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Region id must be a UUID")
+        
+        if not service.get_region(region_id, db):
+            raise HTTPException(status_code=404, detail="Region not found")
+    
+    file_name = f"chargers.{export.EXPORT_FILE_EXTENSIONS[format]}"
+    
+    return StreamingResponse(
+        export.export_chargers(format, region_id),
+        media_type=export.EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'}
+    )
+
+# Not async, so that the long synchronous import runs in the thread pool, off the event loop
+@fast_app.post("/chargers/import", tags=["Bulk data"])
+def import_chargers(
+    path: str = Query(..., description="Path of the GeoJSON, CSV or shapefile to import, relative to the data directory"),
+    format: data_import.ImportFormat = Query(
+        default=None,
+        description="Format of the file. If not provided, it is detected from the file extension."),
+    region_id: str = Query(
+        default=None,
+        description="If provided, region assigned to the chargers without a region_id, instead of the region containing them."),
+    db: Session = Depends(get_db)
+) -> ChargerImportResultDTO:
+    """
+    Bulk import chargers. Chargers with an id are inserted or updated, chargers without one are created.
+    Invalid chargers are rejected and reported, without failing the import.
+    New chargers get a default pricing schedule, updated chargers whose price tier or region changed are repriced.
+    """
+    try:
+        resolved_path = data_import.resolve_import_path(path)
+        import_format = format or data_import.detect_import_format(resolved_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    result = data_import.import_chargers(db, resolved_path, import_format, region_id)
+    
+    return result
+
+# Not async, so that the bulk insert runs in the thread pool, off the event loop
+@fast_app.post("/occupancy-events", tags=["Occupancy"])
+def record_occupancy_events(
+    occupancy_events: OccupancyEventsDTO,
+    db: Session = Depends(get_db)
+) -> OccupancyEventsResultDTO:
+    """
+    Record charger occupancy changes in bulk, and update the chargers' in_use flag to their latest occupancy.
+    Events of unknown chargers are rejected and reported, events already recorded are skipped.
+    """
+    if len(occupancy_events.events) > occupancy.MAX_OCCUPANCY_EVENTS:
+        raise HTTPException(status_code=400, detail=f"At most {occupancy.MAX_OCCUPANCY_EVENTS} events can be recorded at once")
+    
+    result = occupancy.record_occupancy_events(db, occupancy_events.events)
+    
+    return result
+
+# Not async, so that the rollup runs in the thread pool, off the event loop
+@fast_app.post("/occupancy/rollup", tags=["Occupancy"])
+def rollup_occupancy(
+    start: datetime = Query(default=None, description="Start of the hours to roll up, by default 24 hours before end. UTC if no time zone is given."),
+    end: datetime = Query(default=None, description="End of the hours to roll up, by default now. UTC if no time zone is given."),
+    db: Session = Depends(get_db)
+) -> OccupancyRollupResultDTO:
+    """
+    Roll up occupancy events into hourly occupancy, which utilization is computed from.
+    Meant to run periodically, rolled up hours are recomputed to account for late events.
+    """
+    result = occupancy.rollup_occupancy(db, start, end)
+    
+    return result
+
+@fast_app.get("/chargers/{charger_id}/utilization", tags=["Occupancy"])
+async def get_charger_utilization(
+    charger_id: str,
+    start: datetime = Query(default=None, description="Start of the period, by default 30 days before end. UTC if no time zone is given."),
+    end: datetime = Query(default=None, description="End of the period, by default now. UTC if no time zone is given."),
+    db: Session = Depends(get_db)
+) -> UtilizationDTO:
+    """
+    Get the share of time a charger was in use, overall and per hour of the day in its local time.
+    """
+    result = occupancy.get_charger_utilization(db, charger_id, start, end)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Charger not found")
+    
+    return result
+
+@fast_app.get("/regions/{region_id}/utilization", tags=["Occupancy"])
+async def get_region_utilization(
+    region_id: str,
+    start: datetime = Query(default=None, description="Start of the period, by default 30 days before end. UTC if no time zone is given."),
+    end: datetime = Query(default=None, description="End of the period, by default now. UTC if no time zone is given."),
+    db: Session = Depends(get_db)
+) -> UtilizationDTO:
+    """
+    Get the share of time the chargers of a region were in use, overall and per hour of the day in their local time.
+    """
+    result = occupancy.get_region_utilization(db, region_id, start, end)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Region not found")
     
     return result
 
@@ -179,6 +432,7 @@ async def update_charger(
 ) -> ChargerDTO:
     """
     Update a charger's price status or price tier.
+    Changing the price tier reprices the charger's pricing schedule.
     """
     result = service.update_charger(charger_id, db, charger_patch)
     
@@ -187,6 +441,63 @@ async def update_charger(
     
     return result
 
+@fast_app.patch("/regions/{region_id}", tags=["Price setting"])
+async def update_region(
+    region_id: str,
+    region_patch: PatchRegionDTO,
+    db: Session = Depends(get_db)
+) -> RegionDTO:
+    """
+    Update a region's price tier or boundary.
+    Changing the price tier reprices the pricing schedules of all chargers in the region.
+    """
+    result = service.update_region(region_id, db, region_patch)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="Region not found")
+    
+    return result
+
+# Not async, so that the repricing runs in the thread pool, off the event loop
+@fast_app.post("/repricing", tags=["Price setting"])
+def reprice_chargers(
+    repricing_request: RepricingRequestDTO,
+    db: Session = Depends(get_db)
+) -> RepricingResultDTO:
+    """
+    Recompute the price per kWh of all pricing periods of a charger, a region or a state,
+    from the current region and charger price tiers.
+    The new prices are published atomically, schedules stay readable at their previous prices meanwhile.
+    """
+    result = service.reprice_chargers(
+        db,
+        charger_id=repricing_request.charger_id,
+        region_id=repricing_request.region_id,
+        state_code=repricing_request.state_code
+    )
+    
+    return result
+
+# Not async, so that the recomputation runs in the thread pool, off the event loop
+@fast_app.post("/pricing-engine/run", tags=["Price setting"])
+def run_pricing_engine(
+    pricing_engine_request: PricingEngineRequestDTO,
+    db: Session = Depends(get_db)
+) -> PricingEngineResultDTO:
+    """
+    Recompute the demand index of the pricing periods of all chargers, or of a region,
+    from their occupancy over the same hours of the day, and reprice them.
+    Pricing periods are STALE while they are recomputed.
+    For the whole network, prefer running `python -m app.pricing_engine` as a batch job.
+    """
+    result = pricing_engine.run_pricing_engine(
+        db,
+        region_id=pricing_engine_request.region_id,
+        demand_days=pricing_engine_request.demand_days
+    )
+    
+    return result
+
 @fast_app.patch("/pricing-periods/{pricing_period_id}", tags=["Price setting"])
 async def update_pricing_period(
     pricing_period_id: str,
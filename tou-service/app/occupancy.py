@@ -0,0 +1,317 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Boolean, DateTime, Integer, bindparam, exists, literal, select, text, union_all, update
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.database.database import SessionLocal
+from app.database.models import Charger, ChargerOccupancyEvent, ChargerOccupancyHourly, Region
+from app.schemas.data_transfer_objects import HourOfDayUtilizationDTO, OccupancyEventDTO, OccupancyEventsResultDTO, OccupancyRollupResultDTO, UtilizationDTO
+from app.utils.sql_tracing import traced
+
+MAX_OCCUPANCY_EVENTS = 10000
+# Hours rolled up by default, so that events received late are still accounted for
+DEFAULT_ROLLUP_HOURS = 24
+DEFAULT_UTILIZATION_DAYS = 30
+
+HOUR = timedelta(hours=1)
+
+# Monthly partitions of the occupancy events known to exist, to skip their creation
+_event_partitions = set()
+
+def _month_start(moment: datetime) -> datetime:
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+def _next_month_start(month_start: datetime) -> datetime:
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+def _as_utc(moment: datetime | None) -> datetime | None:
+    """
+    Times without a time zone are taken as UTC.
+    """
+    if moment is not None and moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
+
+def _floor_hour(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+def ensure_event_partitions(observed_ats: list[datetime]):
+    """
+    Create the monthly partitions of the occupancy events covering the given times, if missing.
+
+    Partitions are created in a short transaction of their own, so that creating them does
+    not commit the caller's transaction, and the lock they take is released right away.
+    """
+    month_starts = {_month_start(observed_at) for observed_at in observed_ats} - _event_partitions
+    if not month_starts:
+        return
+
+    db = SessionLocal()
+    try:
+        # Serializes concurrent creations of the same partition
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext(ChargerOccupancyEvent.__tablename__))))
+
+        for month_start in sorted(month_starts):
+            name = f"{ChargerOccupancyEvent.__tablename__}_{month_start:%Y_%m}"
+            db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {ChargerOccupancyEvent.__tablename__} "
+                f"FOR VALUES FROM ('{month_start.isoformat()}') TO ('{_next_month_start(month_start).isoformat()}')"
+            ))
+
+        db.commit()
+    finally:
+        db.close()
+
+    _event_partitions.update(month_starts)
+
+@traced
+def record_occupancy_events(db: Session, events: list[OccupancyEventDTO]) -> OccupancyEventsResultDTO:
+    """
+    Append occupancy events in bulk, and set the in_use flag of each charger to its latest
+    known occupancy. Events already recorded are skipped, so that batches can be retried.
+    """
+    parsed_ids = {}
+    for event in events:
+        try:
+            parsed_ids[event.charger_id] = uuid.UUID(event.charger_id)
+        except ValueError:
+            pass
+
+    known_ids = set()
+    if parsed_ids:
+        known_ids = set(db.scalars(select(Charger.id).where(Charger.id.in_(list(set(parsed_ids.values()))))))
+
+    rows = []
+    unknown_charger_ids = []
+    for event in events:
+        charger_id = parsed_ids.get(event.charger_id)
+        if charger_id not in known_ids:
+            unknown_charger_ids.append(event.charger_id)
+            continue
+        rows.append({"charger_id": charger_id, "observed_at": event.observed_at, "in_use": event.in_use})
+
+    if not rows:
+        return OccupancyEventsResultDTO(
+            received_count=len(events),
+            recorded_count=0,
+            unknown_charger_ids=list(dict.fromkeys(unknown_charger_ids))
+        )
+
+    ensure_event_partitions([row["observed_at"] for row in rows])
+
+    recorded = db.execute(
+        insert(ChargerOccupancyEvent).on_conflict_do_nothing().returning(ChargerOccupancyEvent.charger_id),
+        rows
+    ).all()
+
+    latest = {}
+    for row in rows:
+        if row["charger_id"] not in latest or row["observed_at"] > latest[row["charger_id"]]["observed_at"]:
+            latest[row["charger_id"]] = row
+
+    # Late events do not override a more recent occupancy
+    db.connection().execute(
+        update(Charger)
+        .where(
+            Charger.id == bindparam("b_charger_id"),
+            ~exists().where(
+                ChargerOccupancyEvent.charger_id == Charger.id,
+                ChargerOccupancyEvent.observed_at > bindparam("b_observed_at")))
+        .values(in_use=bindparam("b_in_use")),
+        [
+            {"b_charger_id": row["charger_id"], "b_observed_at": row["observed_at"], "b_in_use": row["in_use"]}
+            for row in latest.values()
+        ]
+    )
+    db.commit()
+
+    return OccupancyEventsResultDTO(
+        received_count=len(events),
+        recorded_count=len(recorded),
+        unknown_charger_ids=list(dict.fromkeys(unknown_charger_ids))
+    )
+
+def _rollup_statement(start: datetime, end: datetime):
+    event = ChargerOccupancyEvent
+    hourly = ChargerOccupancyHourly
+
+    # Occupancy at the start of the window is carried from the previous hour's rollup
+    window_events = union_all(
+        select(event.charger_id, event.observed_at, event.in_use, literal(1).label("priority"))
+        .where(event.observed_at >= start, event.observed_at < end),
+        select(
+            hourly.charger_id,
+            literal(start, DateTime(timezone=True)).label("observed_at"),
+            hourly.ending_in_use.label("in_use"),
+            literal(0).label("priority"))
+        .where(hourly.hour_start == start - HOUR)
+    ).subquery("window_events")
+
+    # Each occupancy holds until the next event, or the end of the window
+    intervals = select(
+        window_events.c.charger_id,
+        window_events.c.in_use,
+        window_events.c.observed_at.label("interval_start"),
+        func.coalesce(
+            func.lead(window_events.c.observed_at).over(
+                partition_by=window_events.c.charger_id,
+                order_by=(window_events.c.observed_at, window_events.c.priority)),
+            literal(end, DateTime(timezone=True))
+        ).label("interval_end")
+    ).subquery("intervals")
+
+    # Hours each interval overlaps, generate_series is joined laterally to the intervals
+    hour_start = func.generate_series(
+        func.date_trunc("hour", intervals.c.interval_start, "UTC"),
+        intervals.c.interval_end - timedelta(microseconds=1),
+        HOUR
+    ).column_valued("hour_start")
+
+    seconds = func.extract(
+        "epoch",
+        func.least(intervals.c.interval_end, hour_start + HOUR) - func.greatest(intervals.c.interval_start, hour_start))
+
+    rollup = (
+        select(
+            intervals.c.charger_id,
+            hour_start,
+            func.round(func.coalesce(func.sum(seconds).filter(intervals.c.in_use), 0)),
+            func.round(func.sum(seconds)),
+            func.array_agg(
+                aggregate_order_by(intervals.c.in_use, intervals.c.interval_start.desc()),
+                type_=ARRAY(Boolean))[1])
+        .select_from(intervals)
+        .where(intervals.c.interval_end > intervals.c.interval_start)
+        .group_by(intervals.c.charger_id, hour_start)
+    )
+
+    statement = insert(hourly).from_select(
+        ["charger_id", "hour_start", "busy_seconds", "observed_seconds", "ending_in_use"],
+        rollup
+    )
+
+    return statement.on_conflict_do_update(
+        index_elements=[hourly.charger_id, hourly.hour_start],
+        set_={
+            "busy_seconds": statement.excluded.busy_seconds,
+            "observed_seconds": statement.excluded.observed_seconds,
+            "ending_in_use": statement.excluded.ending_in_use,
+        }
+    )
+
+@traced
+def rollup_occupancy(db: Session, start: datetime | None = None, end: datetime | None = None) -> OccupancyRollupResultDTO:
+    """
+    Roll up the occupancy events of the hours from start to end into hourly occupancy,
+    by default the last DEFAULT_ROLLUP_HOURS hours. Rolled up hours are overwritten, so
+    rollups can be run again over hours that received late events.
+
+    As the occupancy at the start of the window is carried from the rollup of the hour
+    before it, rollups are meant to run in time order, without gaps.
+    """
+    start, end = _as_utc(start), _as_utc(end)
+    now = datetime.now(timezone.utc)
+    end = min(end or now, now)
+    start = _floor_hour(start or end - DEFAULT_ROLLUP_HOURS * HOUR)
+
+    if start >= end:
+        return OccupancyRollupResultDTO(start=start, end=end, hour_count=0)
+
+    result = db.execute(_rollup_statement(start, end))
+    db.commit()
+
+    return OccupancyRollupResultDTO(start=start, end=end, hour_count=result.rowcount)
+
+def _utilization(
+        db: Session,
+        criterion,
+        start: datetime | None,
+        end: datetime | None) -> tuple[datetime, datetime, list[HourOfDayUtilizationDTO]]:
+    start, end = _as_utc(start), _as_utc(end)
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=DEFAULT_UTILIZATION_DAYS)
+
+    hourly = ChargerOccupancyHourly
+    local_hour = func.extract("hour", func.timezone(Charger.time_zone, hourly.hour_start)).cast(Integer)
+
+    rows = db.execute(
+        select(
+            local_hour.label("hour"),
+            func.sum(hourly.busy_seconds).label("busy_seconds"),
+            func.sum(hourly.observed_seconds).label("observed_seconds"))
+        .join(Charger, Charger.id == hourly.charger_id)
+        .where(criterion, hourly.hour_start >= _floor_hour(start), hourly.hour_start < end)
+        .group_by(local_hour)
+    ).all()
+
+    by_hour = {row.hour: row for row in rows}
+    hours_of_day = []
+    for hour in range(24):
+        row = by_hour.get(hour)
+        busy_seconds = int(row.busy_seconds) if row else 0
+        observed_seconds = int(row.observed_seconds) if row else 0
+        hours_of_day.append(HourOfDayUtilizationDTO(
+            hour=hour,
+            busy_seconds=busy_seconds,
+            observed_seconds=observed_seconds,
+            utilization=busy_seconds / observed_seconds if observed_seconds else None
+        ))
+
+    return start, end, hours_of_day
+
+def _utilization_dto(self: str, start: datetime, end: datetime, hours_of_day: list[HourOfDayUtilizationDTO], **owner) -> UtilizationDTO:
+    busy_seconds = sum(hour.busy_seconds for hour in hours_of_day)
+    observed_seconds = sum(hour.observed_seconds for hour in hours_of_day)
+
+    return UtilizationDTO(
+        self=self,
+        start=start,
+        end=end,
+        busy_seconds=busy_seconds,
+        observed_seconds=observed_seconds,
+        utilization=busy_seconds / observed_seconds if observed_seconds else None,
+        hours_of_day=hours_of_day,
+        **owner
+    )
+
+@traced
+def get_charger_utilization(
+        db: Session,
+        charger_id: str,
+        start: datetime | None = None,
+        end: datetime | None = None) -> UtilizationDTO | None:
+    """
+    Utilization of a charger per hour of the day in its local time, from the hourly rollups,
+    by default over the last DEFAULT_UTILIZATION_DAYS days.
+    """
+    charger = db.query(Charger).filter(Charger.id == charger_id).first()
+
+    if not charger:
+        return None
+
+    start, end, hours_of_day = _utilization(db, ChargerOccupancyHourly.charger_id == charger.id, start, end)
+
+    return _utilization_dto(f"/chargers/{charger.id}/utilization", start, end, hours_of_day, charger_id=str(charger.id))
+
+@traced
+def get_region_utilization(
+        db: Session,
+        region_id: str,
+        start: datetime | None = None,
+        end: datetime | None = None) -> UtilizationDTO | None:
+    """
+    Utilization of the chargers of a region per hour of the day in their local time,
+    from the hourly rollups, by default over the last DEFAULT_UTILIZATION_DAYS days.
+    """
+    region = db.query(Region).filter(Region.id == region_id).first()
+
+    if not region:
+        return None
+
+    start, end, hours_of_day = _utilization(db, Charger.region_id == region.id, start, end)
+
+    return _utilization_dto(f"/regions/{region.id}/utilization", start, end, hours_of_day, region_id=str(region.id))
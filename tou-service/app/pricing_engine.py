@@ -0,0 +1,304 @@
+import argparse
+import io
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, Float, Integer, MetaData, Table, any_, cast, insert, literal, select
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.database.database import SessionLocal
+from app.database.models import Charger, ChargerOccupancyHourly, PricingPeriod, PricingPeriodStatus, Region
+from app.schedule_versions import base_pricing_period_criteria, collect_schedule_garbage, mark_schedules_stale, next_schedule_version, publish_schedule_version, snapshot_schedule_versions
+from app.schemas.data_transfer_objects import PricingEngineResultDTO
+from app.utils.pricing_utils import compute_prices_per_kwh
+from app.utils.sql_tracing import traced
+from app.utils.sql_utils import uuid_array
+
+# Number of chargers recomputed per transaction
+ENGINE_CHUNK_SIZE = 20000
+DEFAULT_DEMAND_DAYS = 28
+# Periods observed for less than this over the demand window keep their demand index
+MIN_OBSERVED_SECONDS = 3600
+# Utilization bounds between demand indexes 1 to 5
+DEMAND_INDEX_THRESHOLDS = np.array([0.2, 0.4, 0.6, 0.8])
+
+# Middle of each local hour of the day, in hours, to match hours against pricing periods
+HOUR_MIDPOINTS = np.arange(24) + 0.5
+
+STAGING_COLUMNS = ["id", "schedule_version", "demand_index", "price_per_kwh"]
+
+# Temporary table the recomputed pricing periods are copied to, before staging them in a single statement
+staging_metadata = MetaData()
+pricing_engine_staging = Table(
+    "pricing_engine_staging",
+    staging_metadata,
+    Column("id", UUID(as_uuid=True), nullable=False),
+    Column("schedule_version", Integer, nullable=False),
+    Column("demand_index", Integer, nullable=False),
+    Column("price_per_kwh", Float, nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+def _next_chunk(db: Session, region_id: str | None, after_id: uuid.UUID | None) -> pd.DataFrame:
+    """
+    Next ENGINE_CHUNK_SIZE chargers by id, with their region and charger price tiers.
+    """
+    query = (
+        select(Charger.id, Region.region_price_tier, Charger.charger_price_tier)
+        .join(Region, Region.id == Charger.region_id)
+        .order_by(Charger.id)
+        .limit(ENGINE_CHUNK_SIZE)
+    )
+    if region_id:
+        query = query.where(Charger.region_id == region_id)
+    if after_id:
+        query = query.where(Charger.id > after_id)
+
+    return pd.DataFrame(db.execute(query).all(), columns=["id", "region_price_tier", "charger_price_tier"])
+
+def _chunk_criteria(charger_ids: list[uuid.UUID]) -> list:
+    # The chunk's ids rather than their range, which chargers created since may fall into
+    return [Charger.id == any_(uuid_array(charger_ids))]
+
+def _hourly_usage(db: Session, criteria: list, since: datetime) -> pd.DataFrame:
+    """
+    Busy and observed seconds per charger and hour of the day in the charger's local time,
+    summed in the database over the hourly occupancy rollups since the given time.
+    """
+    hourly = ChargerOccupancyHourly
+    local_hour = func.extract("hour", func.timezone(Charger.time_zone, hourly.hour_start)).cast(Integer)
+
+    rows = db.execute(
+        select(
+            hourly.charger_id,
+            local_hour,
+            func.sum(hourly.busy_seconds),
+            func.sum(hourly.observed_seconds))
+        .join(Charger, Charger.id == hourly.charger_id)
+        .where(hourly.hour_start >= since, *criteria)
+        .group_by(hourly.charger_id, local_hour)
+    ).all()
+
+    return pd.DataFrame(rows, columns=["charger_id", "hour", "busy_seconds", "observed_seconds"])
+
+def _pricing_periods(db: Session) -> pd.DataFrame:
+    """
+    Pricing periods of the snapshotted base schedule versions of the chunk.
+    """
+    rows = db.execute(
+        select(
+            PricingPeriod.id,
+            PricingPeriod.schedule_version,
+            PricingPeriod.charger_id,
+            PricingPeriod.start_time,
+            PricingPeriod.end_time,
+            PricingPeriod.demand_index)
+        .where(*base_pricing_period_criteria())
+    ).all()
+
+    return pd.DataFrame(rows, columns=["id", "schedule_version", "charger_id", "start_time", "end_time", "demand_index"])
+
+def _hours(times: pd.Series) -> np.ndarray:
+    return np.array([t.hour + t.minute / 60 + t.second / 3600 for t in times], dtype=float)
+
+def compute_demand_indexes(
+        chargers: pd.DataFrame,
+        usage: pd.DataFrame,
+        periods: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Demand index of each pricing period from the utilization of its charger over the
+    local hours of the day the period covers, and whether the period was observed long
+    enough for it. Unobserved periods keep their current demand index.
+    """
+    positions = pd.Index(chargers["id"])
+
+    # Busy and observed seconds per charger (rows) and local hour of the day (columns)
+    busy = np.zeros((len(chargers), 24))
+    observed = np.zeros((len(chargers), 24))
+    usage_rows = positions.get_indexer(usage["charger_id"])
+    known = usage_rows >= 0
+    usage_hours = usage["hour"].to_numpy(dtype=int)[known]
+    np.add.at(busy, (usage_rows[known], usage_hours), usage["busy_seconds"].to_numpy(dtype=float)[known])
+    np.add.at(observed, (usage_rows[known], usage_hours), usage["observed_seconds"].to_numpy(dtype=float)[known])
+
+    # Hours of the day covered by each period (rows), wrapping around midnight when it ends before it starts
+    starts = _hours(periods["start_time"])[:, None]
+    ends = _hours(periods["end_time"])[:, None]
+    covered = np.where(
+        starts < ends,
+        (HOUR_MIDPOINTS >= starts) & (HOUR_MIDPOINTS < ends),
+        (HOUR_MIDPOINTS >= starts) | (HOUR_MIDPOINTS < ends))
+
+    period_rows = positions.get_indexer(periods["charger_id"])
+    period_busy = (busy[period_rows] * covered).sum(axis=1)
+    period_observed = (observed[period_rows] * covered).sum(axis=1)
+
+    is_observed = period_observed >= MIN_OBSERVED_SECONDS
+    utilization = np.divide(period_busy, period_observed, out=np.zeros_like(period_busy), where=is_observed)
+    demand_indexes = np.where(
+        is_observed,
+        np.digitize(utilization, DEMAND_INDEX_THRESHOLDS) + 1,
+        periods["demand_index"].to_numpy(dtype=int))
+
+    return demand_indexes, is_observed
+
+def _copy_to_staging(db: Session, rows: pd.DataFrame):
+    buffer = io.StringIO()
+    rows[STAGING_COLUMNS].to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+
+    dbapi_connection = db.connection().connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {pricing_engine_staging.name} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+
+def _stage_schedule_version(db: Session, schedule_version: int):
+    """
+    Insert the recomputed pricing periods under schedule_version, with the same ids, UP_TO_DATE,
+    leaving the periods they were computed from to the readers of the active version.
+    """
+    staging = pricing_engine_staging
+    status_type = PricingPeriod.__table__.c.status.type
+    db.execute(
+        insert(PricingPeriod).from_select(
+            [
+                PricingPeriod.id,
+                PricingPeriod.charger_id,
+                PricingPeriod.schedule_version,
+                PricingPeriod.start_time,
+                PricingPeriod.end_time,
+                PricingPeriod.demand_index,
+                PricingPeriod.price_per_kwh,
+                PricingPeriod.status
+            ],
+            select(
+                PricingPeriod.id,
+                PricingPeriod.charger_id,
+                literal(schedule_version),
+                PricingPeriod.start_time,
+                PricingPeriod.end_time,
+                staging.c.demand_index,
+                staging.c.price_per_kwh,
+                cast(literal(PricingPeriodStatus.UP_TO_DATE, status_type), status_type))
+            .where(
+                PricingPeriod.id == staging.c.id,
+                PricingPeriod.schedule_version == staging.c.schedule_version)
+        )
+    )
+
+@traced
+def run_pricing_engine(
+        db: Session,
+        region_id: str | None = None,
+        demand_days: int | None = None) -> PricingEngineResultDTO:
+    """
+    Recompute the demand index of every pricing period, of all chargers or of a region,
+    from the occupancy of its charger over the same local hours in the last demand_days,
+    and its price per kWh from the demand index and the current price tiers.
+
+    Chargers are processed in chunks of ENGINE_CHUNK_SIZE, by id. The active pricing
+    periods of a chunk are first marked STALE and committed. Occupancy is then summed per
+    charger and local hour in the database, demand is computed for all periods of the chunk
+    at once with NumPy, and the results are copied to a staging table and inserted, UP_TO_DATE,
+    as a new schedule version of the chunk with a single INSERT ... SELECT. The chunk's
+    chargers are switched to that version in the same transaction, so schedules stay readable
+    throughout, and the versions no longer in use are then deleted.
+
+    Chargers whose schedule another writer published while their chunk was recomputed keep
+    that schedule, which is up to date, and are reported as skipped.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=demand_days or DEFAULT_DEMAND_DAYS)
+
+    charger_count = 0
+    skipped_charger_count = 0
+    pricing_period_count = 0
+    observed_period_count = 0
+    changed_demand_index_count = 0
+
+    after_id = None
+    while True:
+        chargers = _next_chunk(db, region_id, after_id)
+        if chargers.empty:
+            break
+
+        after_id = chargers["id"].iloc[-1]
+        criteria = _chunk_criteria(chargers["id"].tolist())
+
+        mark_schedules_stale(db, criteria)
+        db.commit()
+
+        schedule_version = next_schedule_version(db)
+        try:
+            snapshot_schedule_versions(db, criteria)
+            usage = _hourly_usage(db, criteria, since)
+            periods = _pricing_periods(db)
+
+            if not periods.empty:
+                demand_indexes, is_observed = compute_demand_indexes(chargers, usage, periods)
+
+                tiers = chargers.set_index("id").loc[periods["charger_id"]]
+                periods["price_per_kwh"] = compute_prices_per_kwh(
+                    tiers["region_price_tier"].to_numpy(),
+                    tiers["charger_price_tier"].to_numpy(),
+                    demand_indexes)
+                changed_demand_indexes = periods["demand_index"].to_numpy() != demand_indexes
+                periods["demand_index"] = demand_indexes
+
+                pricing_engine_staging.create(db.connection())
+                _copy_to_staging(db, periods)
+                _stage_schedule_version(db, schedule_version)
+                published_count, skipped_ids = publish_schedule_version(db, schedule_version)
+
+                published = ~periods["charger_id"].isin(skipped_ids).to_numpy()
+                charger_count += published_count
+                skipped_charger_count += len(skipped_ids)
+                pricing_period_count += int(published.sum())
+                observed_period_count += int((is_observed & published).sum())
+                changed_demand_index_count += int((changed_demand_indexes & published).sum())
+
+            db.commit()
+        except Exception:
+            # The chunk's periods are left STALE, as their prices were not recomputed
+            db.rollback()
+            raise
+
+        collect_schedule_garbage(db, criteria)
+        db.commit()
+
+    result = PricingEngineResultDTO(
+        charger_count=charger_count,
+        pricing_period_count=pricing_period_count,
+        observed_period_count=observed_period_count,
+        changed_demand_index_count=changed_demand_index_count,
+        skipped_charger_count=skipped_charger_count
+    )
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute demand indexes and prices from occupancy history.")
+    parser.add_argument("--region-id", help="Only recompute the chargers of this region")
+    parser.add_argument(
+        "--demand-days",
+        type=int,
+        default=DEFAULT_DEMAND_DAYS,
+        help="Number of days of occupancy history demand is computed from")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = run_pricing_engine(db, args.region_id, args.demand_days)
+    finally:
+        db.close()
+
+    print(result.model_dump_json(indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.database.database import engine
+from app.utils.sql_tracing import SqlTrace, install_sql_tracing, sql_trace
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Frames at the top of a thread's stack when it is waiting for work, rather than working
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+}
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler over the event loop thread and the threads running the
+    traced service calls of the request, so that synchronous calls run in the thread pool
+    are profiled along with the event loop, but not other requests served meanwhile.
+    Samples are aggregated as collapsed stacks. Threads executing a SQL statement of the
+    trace get the statement as an extra leaf frame.
+    """
+    def __init__(self, interval: float, trace: SqlTrace, loop_thread_id: int):
+        self.interval = interval
+        self.trace = trace
+        self.loop_thread_id = loop_thread_id
+        self.stacks = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        thread_names = {}
+
+        while not self._stop.wait(self.interval):
+            self.sample_count += 1
+            frames = sys._current_frames()
+
+            for thread_id in {self.loop_thread_id} | set(self.trace.calling_threads):
+                frame = frames.get(thread_id)
+                if frame is None or _is_idle(frame):
+                    continue
+
+                if thread_id not in thread_names:
+                    thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+
+                stack = [thread_names.get(thread_id, str(thread_id))] + _frame_labels(frame)
+                statement = self.trace.executing.get(thread_id)
+                if statement:
+                    stack.append("SQL: " + " ".join(statement.split())[:120])
+
+                self.stacks[";".join(stack)] += 1
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+def _frame_labels(frame) -> list[str]:
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        # Semicolons separate frames in the collapsed stack format
+        labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":"))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+class ProfilingMiddleware:
+    """
+    Opt-in per-request profiling.
+
+    A request is profiled if it carries the X-Profile header with the profiling token,
+    or if it is picked by the sampling rate. Its stacks are written as a collapsed stack
+    file (for flamegraph.pl or speedscope), along with a JSON file holding the request
+    timings and the SQL statements executed, and the response gets an X-Profile-Id header
+    naming the files.
+    A single request is profiled at a time, requests arriving in the meantime are not profiled.
+    """
+    def __init__(
+            self,
+            app: ASGIApp,
+            token: str | None,
+            sample_rate: float,
+            output_dir: str,
+            interval: float):
+        self.app = app
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.interval = interval
+        self._lock = threading.Lock()
+        install_sql_tracing(engine)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            self._lock.release()
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send):
+        started_at = datetime.now(timezone.utc)
+        path = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+        profile_id = f"{started_at:%Y%m%dT%H%M%S}-{scope['method'].lower()}-{path}-{uuid.uuid4().hex[:8]}"
+        status_code = None
+
+        async def send_with_profile_id(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        with sql_trace() as trace:
+            sampler = StackSampler(self.interval, trace, threading.get_ident())
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            sampler.start()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                sampler.stop()
+                wall_time = time.perf_counter() - wall_start
+                cpu_time = time.process_time() - cpu_start
+
+        summary = {
+            "id": profile_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "query_string": scope["query_string"].decode(),
+            "status_code": status_code,
+            "started_at": started_at.isoformat(),
+            "wall_time_ms": round(wall_time * 1000, 3),
+            # CPU time of the whole process, including other requests served concurrently
+            "process_cpu_time_ms": round(cpu_time * 1000, 3),
+            # Outermost traced service calls, with the CPU time of the thread running them
+            "service_calls": [
+                {
+                    "function": call.function,
+                    "wall_time_ms": round(call.duration * 1000, 3),
+                    "cpu_time_ms": round(call.cpu_time * 1000, 3)
+                } for call in trace.calls
+            ],
+            "sampling_interval_ms": self.interval * 1000,
+            "sample_count": sampler.sample_count,
+            "sql_statement_count": len(trace.statements),
+            "sql_time_ms": round(sum(statement.duration for statement in trace.statements) * 1000, 3),
+            "sql_statements": [
+                {
+                    "statement": statement.statement,
+                    "duration_ms": round(statement.duration * 1000, 3),
+                    "rowcount": statement.rowcount
+                } for statement in trace.statements
+            ]
+        }
+
+        await run_in_threadpool(self._write, profile_id, sampler.stacks, summary)
+
+    def _write(self, profile_id: str, stacks: Counter, summary: dict):
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        with open(os.path.join(self.output_dir, f"{profile_id}.collapsed"), "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        with open(os.path.join(self.output_dir, f"{profile_id}.json"), "w") as f:
+            json.dump(summary, f, indent=2)
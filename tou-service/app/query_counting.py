@@ -0,0 +1,41 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.database.database import engine
+from app.utils.sql_tracing import install_sql_tracing, sql_trace
+
+QUERY_COUNT_HEADER = b"x-query-count"
+QUERY_ROWS_HEADER = b"x-query-rows"
+QUERY_COUNT_BY_FUNCTION_HEADER = b"x-query-count-by-function"
+
+class QueryCountMiddleware:
+    """
+    Report the number of SQL statements executed by a request, the number of rows they
+    fetched or affected, and the number of statements per service function, as response
+    headers. Meant for development, to spot N+1 query patterns.
+    
+    Counts are taken when the response starts, so statements executed while a response
+    is streamed are not included.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        install_sql_tracing(engine)
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        with sql_trace() as trace:
+            async def send_with_query_counts(message: Message):
+                if message["type"] == "http.response.start":
+                    by_function = ", ".join(
+                        f"{function}={count}" for function, count in trace.query_counts_by_function().items()
+                    )
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (QUERY_COUNT_HEADER, str(trace.query_count).encode()),
+                        (QUERY_ROWS_HEADER, str(trace.row_count).encode()),
+                        (QUERY_COUNT_BY_FUNCTION_HEADER, by_function.encode()),
+                    ]
+                await send(message)
+            
+            await self.app(scope, receive, send_with_query_counts)
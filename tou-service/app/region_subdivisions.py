@@ -0,0 +1,31 @@
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.database.models import Region, RegionSubdivision
+from app.utils.sql_tracing import traced
+
+# Maximum number of vertices of the polygons region boundaries are subdivided into
+REGION_SUBDIVISION_MAX_VERTICES = 64
+
+@traced
+def refresh_region_subdivisions(db: Session, region_id: str | None = None):
+    """
+    Rebuild the subdivided boundaries of a region, or of all regions, after their
+    boundary changed. Does not commit.
+    """
+    delete_statement = delete(RegionSubdivision)
+    insert_source = select(
+        Region.id,
+        func.ST_Subdivide(Region.boundary, REGION_SUBDIVISION_MAX_VERTICES)
+    ).where(Region.boundary.is_not(None))
+    
+    if region_id:
+        delete_statement = delete_statement.where(RegionSubdivision.region_id == region_id)
+        insert_source = insert_source.where(Region.id == region_id)
+    
+    db.execute(delete_statement.execution_options(synchronize_session=False))
+    db.execute(insert(RegionSubdivision).from_select(
+        [RegionSubdivision.region_id, RegionSubdivision.geometry],
+        insert_source
+    ))
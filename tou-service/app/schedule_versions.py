@@ -0,0 +1,211 @@
+import uuid
+
+from sqlalchemy import Column, Integer, MetaData, Table, any_, cast, delete, exists, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.database.models import Charger, PricingPeriod, PricingPeriodStatus, Region, schedule_version_seq
+from app.utils.pricing_utils import price_per_kwh_expression
+from app.utils.sql_utils import uuid_array
+
+# Pricing schedules are double-buffered. Writers insert the repriced periods of a charger
+# under a new schedule version, next to the active one, and publish them by pointing the
+# charger's active_schedule_version at the new version, in the same transaction.
+# Readers only read the periods of the active version, so they see either the old or the
+# new schedule, never a partial one, and are never blocked by a repricing.
+#
+# A new version is derived from the version active when the writer started, its base. It is
+# only published if the base is still active, so that a writer never replaces a schedule it
+# did not see, whatever the order in which concurrent writers got their version numbers.
+
+# Number of times the chargers whose schedule changed during a repricing are repriced again
+MAX_REPRICING_ATTEMPTS = 3
+
+# Temporary table of the base schedule version of each charger being repriced
+staging_metadata = MetaData()
+schedule_version_bases = Table(
+    "schedule_version_bases",
+    staging_metadata,
+    Column("charger_id", UUID(as_uuid=True), primary_key=True),
+    Column("schedule_version", Integer, nullable=False),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+def next_schedule_version(db: Session) -> int:
+    return db.execute(select(schedule_version_seq.next_value())).scalar_one()
+
+def snapshot_schedule_versions(db: Session, criteria: list) -> Table:
+    """
+    Record the active schedule version of the chargers matching the criteria as the base of
+    their new version, in a temporary table dropped at the end of the transaction.
+    """
+    schedule_version_bases.create(db.connection())
+    db.execute(
+        insert(schedule_version_bases).from_select(
+            ["charger_id", "schedule_version"],
+            select(Charger.id, Charger.active_schedule_version).where(*criteria)
+        )
+    )
+    return schedule_version_bases
+
+def base_pricing_period_criteria() -> list:
+    """
+    Criteria selecting the pricing periods of the base versions, to derive new versions from.
+    """
+    return [
+        PricingPeriod.charger_id == schedule_version_bases.c.charger_id,
+        PricingPeriod.schedule_version == schedule_version_bases.c.schedule_version,
+    ]
+
+def publish_schedule_version(db: Session, schedule_version: int) -> tuple[int, list[uuid.UUID]]:
+    """
+    Point the snapshotted chargers that have pricing periods staged under schedule_version
+    at it, if their base version is still active. Does not commit.
+    Returns the number of chargers switched, and the ids of those skipped because another
+    writer published a version since their snapshot.
+    """
+    bases = schedule_version_bases
+    staged = exists().where(
+        PricingPeriod.charger_id == Charger.id,
+        PricingPeriod.schedule_version == schedule_version)
+
+    published_count = db.execute(
+        update(Charger)
+        .where(
+            Charger.id == bases.c.charger_id,
+            Charger.active_schedule_version == bases.c.schedule_version,
+            staged)
+        .values(
+            previous_schedule_version=Charger.active_schedule_version,
+            active_schedule_version=schedule_version)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    skipped_ids = db.scalars(
+        select(Charger.id)
+        .join(bases, bases.c.charger_id == Charger.id)
+        .where(Charger.active_schedule_version != schedule_version, staged)
+    ).all()
+
+    return published_count, skipped_ids
+
+def mark_schedules_stale(db: Session, criteria: list):
+    """
+    Mark the active pricing periods of the chargers matching the criteria STALE, until they
+    are recomputed. Does not commit.
+    """
+    db.execute(
+        update(PricingPeriod)
+        .where(
+            PricingPeriod.charger_id == Charger.id,
+            PricingPeriod.schedule_version == Charger.active_schedule_version,
+            *criteria)
+        .values(status=PricingPeriodStatus.STALE)
+        .execution_options(synchronize_session=False)
+    )
+
+def collect_schedule_garbage(db: Session, criteria: list) -> int:
+    """
+    Delete the pricing periods of the chargers matching the criteria that belong neither
+    to their active nor to their previous schedule version, returning the number of periods
+    deleted. Does not commit.
+    The previous version is kept for readers that looked up the active version just before
+    it was replaced.
+    """
+    return db.execute(
+        delete(PricingPeriod)
+        .where(
+            PricingPeriod.charger_id == Charger.id,
+            *criteria,
+            PricingPeriod.schedule_version != Charger.active_schedule_version,
+            PricingPeriod.schedule_version != func.coalesce(
+                Charger.previous_schedule_version,
+                Charger.active_schedule_version))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+def _stage_repriced_schedules(db: Session, schedule_version: int) -> int:
+    """
+    Insert the periods of the base versions under schedule_version, with the same ids,
+    repriced from the current price tiers. Returns the number of periods staged.
+    """
+    status_type = PricingPeriod.__table__.c.status.type
+    return db.execute(
+        insert(PricingPeriod).from_select(
+            [
+                PricingPeriod.id,
+                PricingPeriod.charger_id,
+                PricingPeriod.schedule_version,
+                PricingPeriod.start_time,
+                PricingPeriod.end_time,
+                PricingPeriod.demand_index,
+                PricingPeriod.price_per_kwh,
+                PricingPeriod.status
+            ],
+            select(
+                PricingPeriod.id,
+                PricingPeriod.charger_id,
+                literal(schedule_version),
+                PricingPeriod.start_time,
+                PricingPeriod.end_time,
+                PricingPeriod.demand_index,
+                price_per_kwh_expression(
+                    Region.region_price_tier,
+                    Charger.charger_price_tier,
+                    PricingPeriod.demand_index),
+                cast(literal(PricingPeriodStatus.UP_TO_DATE, status_type), status_type))
+            .where(
+                *base_pricing_period_criteria(),
+                PricingPeriod.charger_id == Charger.id,
+                Charger.region_id == Region.id)
+        )
+    ).rowcount
+
+def reprice_schedules(db: Session, criteria: list) -> tuple[int, int, int]:
+    """
+    Reprice the schedules of the chargers matching the criteria from the current price tiers,
+    each attempt in its own transaction. Changes pending in the session, such as a new price
+    tier, are committed with the first attempt, together with the schedules priced from them.
+    Chargers skipped because another writer published their schedule meanwhile are marked
+    STALE, as it may be priced from previous tiers, and repriced again from it, up to
+    MAX_REPRICING_ATTEMPTS times. Versions no longer in use are then deleted.
+    Returns the number of chargers and pricing periods repriced, and of chargers still skipped.
+    """
+    charger_count = 0
+    pricing_period_count = 0
+    attempt_criteria = criteria
+    skipped_ids = []
+
+    for _ in range(MAX_REPRICING_ATTEMPTS):
+        schedule_version = next_schedule_version(db)
+        try:
+            snapshot_schedule_versions(db, attempt_criteria)
+            staged_count = _stage_repriced_schedules(db, schedule_version)
+            published_count, skipped_ids = publish_schedule_version(db, schedule_version)
+            if skipped_ids:
+                skipped_criteria = [Charger.id == any_(uuid_array(skipped_ids))]
+                mark_schedules_stale(db, skipped_criteria)
+                # Periods of skipped chargers are counted when they are repriced again
+                staged_count -= db.scalar(
+                    select(func.count())
+                    .select_from(PricingPeriod)
+                    .where(
+                        PricingPeriod.charger_id == any_(uuid_array(skipped_ids)),
+                        PricingPeriod.schedule_version == schedule_version))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        charger_count += published_count
+        pricing_period_count += staged_count
+        if not skipped_ids:
+            break
+        attempt_criteria = skipped_criteria
+
+    collect_schedule_garbage(db, criteria)
+    db.commit()
+
+    return charger_count, pricing_period_count, len(skipped_ids)
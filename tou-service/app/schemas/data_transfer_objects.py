@@ -1,6 +1,7 @@
-from pydantic import BaseModel, field_serializer, Field
-from datetime import time
+from pydantic import AwareDatetime, BaseModel, field_serializer, Field
+from datetime import datetime, time
 from typing import Annotated
+import enum
 from app.database.models import ChargerPriceStatus, PricingPeriodStatus
 
 class RegionDTO(BaseModel):
@@ -39,15 +40,6 @@ class ChargersDTO(BaseModel):
     count: Annotated[int, Field(description="Number of chargers in this collection")]
     contents: Annotated[list[ChargerDTO], Field(description="List of chargers in this collection")]
     
-class DistancedChargerDTO(ChargerDTO):
-    distance_meters: Annotated[float, Field(description="Distance from the specified location in meters")]
-    
-class DistancedChargersDTO(BaseModel):
-    self: Annotated[str, Field(description="Relative URL to this collection of distanced chargers")]
-    kind: str = "Collection"
-    count: Annotated[int, Field(description="Number of distanced chargers in this collection")]
-    contents: Annotated[list[DistancedChargerDTO], Field(description="List of distanced chargers in this collection")]
-    
 class PricingPeriodDTO(BaseModel):
     self: Annotated[str, Field(description="Relative URL to the pricing period resource")]
     kind: str = "PricingPeriod"
@@ -73,10 +65,132 @@ class PricingScheduleDTO(BaseModel):
 class PricingPeriodsDTO(PricingScheduleDTO):
     pass
 
+class ChargerEmbed(enum.Enum):
+    CURRENT_PRICING_PERIOD = "current_pricing_period"
+    PRICING_SCHEDULE = "pricing_schedule"
+
+class PricedChargerDTO(ChargerDTO):
+    current_pricing_period: Annotated[PricingPeriodDTO | None, Field(description="Current pricing period of the charger, if requested")] = None
+    pricing_schedule: Annotated[list[PricingPeriodDTO] | None, Field(description="Pricing periods of the charger, if requested")] = None
+
+class PricedChargersDTO(BaseModel):
+    self: Annotated[str, Field(description="Relative URL to this collection of chargers")]
+    kind: str = "Collection"
+    count: Annotated[int, Field(description="Number of chargers in this collection")]
+    contents: Annotated[list[PricedChargerDTO], Field(description="List of chargers in this collection")]
+
+class DistancedChargerDTO(ChargerDTO):
+    distance_meters: Annotated[float, Field(description="Distance from the specified location in meters")]
+    current_pricing_period: Annotated[PricingPeriodDTO | None, Field(description="Current pricing period of the charger, if requested")] = None
+    
+class DistancedChargersDTO(BaseModel):
+    self: Annotated[str, Field(description="Relative URL to this collection of distanced chargers")]
+    kind: str = "Collection"
+    count: Annotated[int, Field(description="Number of distanced chargers in this collection")]
+    contents: Annotated[list[DistancedChargerDTO], Field(description="List of distanced chargers in this collection")]
+
+class ChargersMultiGetDTO(BaseModel):
+    self: Annotated[str, Field(description="Relative URL to this collection of chargers")]
+    kind: str = "Collection"
+    count: Annotated[int, Field(description="Number of chargers found")]
+    contents: Annotated[list[PricedChargerDTO], Field(description="Chargers found, in the order they were requested")]
+    not_found: Annotated[list[str], Field(description="Requested charger ids that were not found")]
+
 class PatchChargerDTO(BaseModel):
     price_status: Annotated[str | None,  Field(description="New price status")] = None  # Enum type
     charger_price_tier: Annotated[int | None, Field(description="New price tier, integer from 1 to 5")] = None
 
+class PatchRegionDTO(BaseModel):
+    region_price_tier: Annotated[int | None, Field(description="New price tier, integer from 1 to 5")] = None
+    boundary: Annotated[dict | None, Field(description="New boundary, as a GeoJSON Polygon or MultiPolygon geometry in WGS 84 coordinates")] = None
+
+class RepricingRequestDTO(BaseModel):
+    charger_id: Annotated[str | None, Field(description="If provided, only reprice this charger")] = None
+    region_id: Annotated[str | None, Field(description="If provided, only reprice chargers in this region")] = None
+    state_code: Annotated[str | None, Field(description="If provided, only reprice chargers in regions with this state code, case insensitive")] = None
+
+class RepricingResultDTO(BaseModel):
+    kind: str = "RepricingResult"
+    charger_count: Annotated[int, Field(description="Number of chargers whose pricing schedule was repriced")]
+    pricing_period_count: Annotated[int, Field(description="Number of pricing periods repriced")]
+    skipped_charger_count: Annotated[int, Field(description="Number of chargers not repriced, as their schedule kept being replaced by other writers")]
+
+class PricingEngineRequestDTO(BaseModel):
+    region_id: Annotated[str | None, Field(description="If provided, only recompute the chargers of this region")] = None
+    demand_days: Annotated[int | None, Field(description="Number of days of occupancy history demand is computed from, 28 by default", ge=1)] = None
+
+class PricingEngineResultDTO(BaseModel):
+    kind: str = "PricingEngineResult"
+    charger_count: Annotated[int, Field(description="Number of chargers whose recomputed schedule was published")]
+    pricing_period_count: Annotated[int, Field(description="Number of pricing periods recomputed")]
+    observed_period_count: Annotated[int, Field(description="Number of pricing periods with enough occupancy history to derive their demand index, the others keep theirs")]
+    changed_demand_index_count: Annotated[int, Field(description="Number of pricing periods whose demand index changed")]
+    skipped_charger_count: Annotated[int, Field(description="Number of chargers not recomputed, as another writer replaced their schedule during the run")]
+
+class ChargerImportErrorDTO(BaseModel):
+    row: Annotated[int, Field(description="Row number of the rejected charger in the imported file, starting at 1")]
+    reason: Annotated[str, Field(description="Reason the charger was rejected")]
+
+class ChargerImportResultDTO(BaseModel):
+    kind: str = "ChargerImportResult"
+    row_count: Annotated[int, Field(description="Number of chargers read from the imported file")]
+    imported_count: Annotated[int, Field(description="Number of chargers inserted or updated")]
+    scheduled_count: Annotated[int, Field(description="Number of new chargers given a default pricing schedule")]
+    repriced_count: Annotated[int, Field(description="Number of updated chargers whose pricing schedule was repriced, as their price tier or region changed")]
+    rejected_count: Annotated[int, Field(description="Number of chargers rejected")]
+    errors: Annotated[list[ChargerImportErrorDTO], Field(description="Sample of rejected chargers, with the reason they were rejected")]
+
+class SingleFlightStatsDTO(BaseModel):
+    kind: str = "SingleFlightStats"
+    name: Annotated[str, Field(description="Name of the coalesced endpoint")]
+    enabled: Annotated[bool, Field(description="True if concurrent identical requests are coalesced")]
+    calls: Annotated[int, Field(description="Number of requests served")]
+    coalesced: Annotated[int, Field(description="Number of requests served by sharing the database query of a concurrent identical request")]
+
+class SingleFlightStatsCollectionDTO(BaseModel):
+    self: Annotated[str, Field(description="Relative URL to this collection of single-flight statistics")]
+    kind: str = "Collection"
+    count: Annotated[int, Field(description="Number of coalesced endpoints")]
+    contents: Annotated[list[SingleFlightStatsDTO], Field(description="Single-flight statistics per endpoint")]
+
+class OccupancyEventDTO(BaseModel):
+    charger_id: Annotated[str, Field(description="UUID of the charger")]
+    observed_at: Annotated[AwareDatetime, Field(description="Time the occupancy was observed, with its time zone offset")]
+    in_use: Annotated[bool, Field(description="True if the charger is in use from this time on")]
+
+class OccupancyEventsDTO(BaseModel):
+    events: Annotated[list[OccupancyEventDTO], Field(description="Occupancy events to record, in any order")]
+
+class OccupancyEventsResultDTO(BaseModel):
+    kind: str = "OccupancyEventsResult"
+    received_count: Annotated[int, Field(description="Number of events received")]
+    recorded_count: Annotated[int, Field(description="Number of events recorded, leaving out events already recorded")]
+    unknown_charger_ids: Annotated[list[str], Field(description="Charger ids of the events rejected because the charger does not exist")]
+
+class OccupancyRollupResultDTO(BaseModel):
+    kind: str = "OccupancyRollupResult"
+    start: Annotated[datetime, Field(description="Start of the rolled up hours")]
+    end: Annotated[datetime, Field(description="End of the rolled up hours")]
+    hour_count: Annotated[int, Field(description="Number of charger hours rolled up")]
+
+class HourOfDayUtilizationDTO(BaseModel):
+    hour: Annotated[int, Field(description="Hour of the day in the charger's local time, 0 to 23")]
+    busy_seconds: Annotated[int, Field(description="Seconds in use during this hour of the day")]
+    observed_seconds: Annotated[int, Field(description="Seconds with a known occupancy during this hour of the day")]
+    utilization: Annotated[float | None, Field(description="Share of the observed time in use, from 0 to 1, None if never observed")]
+
+class UtilizationDTO(BaseModel):
+    self: Annotated[str, Field(description="Relative URL to this utilization")]
+    kind: str = "Utilization"
+    charger_id: Annotated[str | None, Field(description="UUID of the charger, for the utilization of a charger")] = None
+    region_id: Annotated[str | None, Field(description="UUID of the region, for the utilization of the chargers of a region")] = None
+    start: Annotated[datetime, Field(description="Start of the period covered")]
+    end: Annotated[datetime, Field(description="End of the period covered")]
+    busy_seconds: Annotated[int, Field(description="Seconds in use over the period")]
+    observed_seconds: Annotated[int, Field(description="Seconds with a known occupancy over the period")]
+    utilization: Annotated[float | None, Field(description="Share of the observed time in use, from 0 to 1, None if never observed")]
+    hours_of_day: Annotated[list[HourOfDayUtilizationDTO], Field(description="Utilization per hour of the day, in the chargers' local time")]
+
 class UpdatePricingPeriodDTO(BaseModel):
     start_time: Annotated[str, Field(description="Start time in HH:MM format")]
     end_time: Annotated[str, Field(description="End time in HH:MM format")]
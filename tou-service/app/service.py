@@ -1,18 +1,29 @@
 import pytz
-from datetime import datetime
-from sqlalchemy.orm import Session, joinedload
-from app.database.models import PricingPeriod, PricingPeriodStatus, Region, Charger, ChargerPriceStatus
-from app.schemas.data_transfer_objects import DistancedChargerDTO, DistancedChargersDTO, PatchChargerDTO, PricingPeriodDTO, PricingPeriodsDTO, PricingScheduleDTO, RegionDTO, RegionsDTO, ChargersDTO, ChargerDTO, GeoJSONPoint
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session, aliased, joinedload
+from app.database.models import PricingPeriod, PricingPeriodStatus, Region, RegionSubdivision, Charger, ChargerPriceStatus
+from app.schemas.data_transfer_objects import ChargerEmbed, ChargersMultiGetDTO, PricedChargerDTO, PricedChargersDTO, DistancedChargerDTO, DistancedChargersDTO, PatchChargerDTO, PatchRegionDTO, PricingPeriodDTO, PricingPeriodsDTO, PricingScheduleDTO, RegionDTO, RegionsDTO, ChargerDTO, GeoJSONPoint, RepricingResultDTO
 from geoalchemy2.shape import from_shape, to_shape
-from shapely.geometry import Point
+from shapely.geometry import MultiPolygon, Point, mapping, shape
+from shapely.validation import make_valid
 from fastapi import HTTPException
 from app.utils.time_utils import is_time_in_interval
+from app.utils.sql_tracing import traced
+from app.utils.sql_utils import uuid_array
 from sqlalchemy.sql import func, text
-from sqlalchemy import cast, MetaData
+from sqlalchemy import Time, and_, any_, case, cast, exists, or_, select, true, MetaData
 from geoalchemy2 import Geography
 from app.database.database import Base, engine
+from app.spatial_index import charger_spatial_index
+from app.schedule_versions import reprice_schedules
+from app.region_subdivisions import refresh_region_subdivisions
 from sqlalchemy_schemadisplay import create_schema_graph
 
+MAX_MULTI_GET_IDS = 100
+
+@traced
 def init_db_min(db: Session):
     region_alameda_ca = Region(
         name="Alameda County",
@@ -47,6 +58,7 @@ def init_db_min(db: Session):
     db.add(charger)
     db.commit()
     
+@traced
 def create_db_viz(db: Session):
     # Create a new MetaData object with only the tables you want
     metadata = MetaData()
@@ -69,6 +81,7 @@ def create_db_viz(db: Session):
     graph.write_png("/data/filtered_schema.png")
 
 
+@traced
 def get_regions(
         db: Session,
         state_code: str,
@@ -97,6 +110,7 @@ def get_regions(
     
     return result
     
+@traced
 def get_region(region_id: str, db: Session) -> RegionDTO | None:
     region = db.query(Region).filter(Region.id == region_id).first()
     
@@ -113,12 +127,26 @@ def get_region(region_id: str, db: Session) -> RegionDTO | None:
     
     return result
 
+@traced
 def get_chargers(
         db: Session,
         operational_only: bool,
         not_in_use_only: bool,
-        region_id: str) -> ChargersDTO:
-    query = db.query(Charger)
+        region_id: str,
+        within_region_id: str | None = None,
+        include_current_price: bool = False,
+        sort_by_price: bool = False) -> PricedChargersDTO:
+    """
+    Get chargers, optionally with their current pricing period, joined in the same query.
+    Sorting by price implies including it, chargers without a current pricing period come last.
+    """
+    include_current_price = include_current_price or sort_by_price
+    current_pricing_period = aliased(PricingPeriod, _current_pricing_period_subquery())
+    
+    if include_current_price:
+        query = db.query(Charger, current_pricing_period).outerjoin(current_pricing_period, true())
+    else:
+        query = db.query(Charger)
     
     if not_in_use_only:
         query = query.filter(Charger.in_use == False)
@@ -128,11 +156,19 @@ def get_chargers(
         
     if region_id:
         query = query.filter(Charger.region_id == region_id)
+    
+    if within_region_id:
+        query = query.filter(_within_region_criterion(within_region_id))
+    
+    if sort_by_price:
+        query = query.order_by(current_pricing_period.price_per_kwh.asc().nulls_last(), Charger.id)
         
     chargers = query.all()
+    if not include_current_price:
+        chargers = [(charger, None) for charger in chargers]
     
     contents = []
-    for charger in chargers:
+    for charger, period in chargers:
         point = to_shape(charger.location)
         coords = (point.x, point.y)
         geo_point = GeoJSONPoint(
@@ -140,7 +176,7 @@ def get_chargers(
             coordinates=coords
         )
         
-        charger_dto = ChargerDTO(
+        charger_dto = PricedChargerDTO(
             self=f"/chargers/{charger.id}",
             id=str(charger.id),
             region_id=str(charger.region_id),
@@ -149,11 +185,12 @@ def get_chargers(
             in_use=charger.in_use,
             charger_price_tier=charger.charger_price_tier,
             price_status=charger.price_status.value,
-            operational=charger.operational
+            operational=charger.operational,
+            current_pricing_period=_pricing_period_dto(period) if period else None
         )
         contents.append(charger_dto)
     
-    result = ChargersDTO(
+    result = PricedChargersDTO(
         self="/chargers",
         count=len(contents),
         contents=contents
@@ -161,6 +198,7 @@ def get_chargers(
     
     return result
 
+@traced
 def get_charger(charger_id: str, db: Session) -> ChargerDTO | None:
     charger = db.query(Charger).filter(Charger.id == charger_id).first()
     
@@ -189,20 +227,117 @@ def get_charger(charger_id: str, db: Session) -> ChargerDTO | None:
     
     return result
 
+def _pricing_period_dto(period: PricingPeriod) -> PricingPeriodDTO:
+    return PricingPeriodDTO(
+        self=f"/pricing_periods/{period.id}",
+        id=str(period.id),
+        charger_id=str(period.charger_id),
+        start_time=period.start_time,
+        end_time=period.end_time,
+        demand_index=period.demand_index,
+        price_per_kwh=period.price_per_kwh,
+        status=period.status.value
+    )
+
+@traced
+def get_chargers_by_ids(
+        db: Session,
+        charger_ids: list[str],
+        embed: ChargerEmbed | None = None) -> ChargersMultiGetDTO:
+    """
+    Get chargers by id, optionally with their current pricing period or their pricing schedule.
+    
+    Takes a constant number of queries whatever the number of ids: one for the chargers,
+    and one for the pricing periods of all of them if embedded.
+    Ids of chargers that do not exist, or that are not valid UUIDs, are reported as not found.
+    """
+    requested_ids = list(dict.fromkeys(charger_ids))
+    
+    parsed_ids = {}
+    for charger_id in requested_ids:
+        try:
+            parsed_ids[charger_id] = uuid.UUID(charger_id)
+        except ValueError:
+            pass
+    
+    chargers = {}
+    if parsed_ids:
+        query = db.query(Charger).filter(Charger.id == any_(uuid_array(list(parsed_ids.values()))))
+        chargers = {charger.id: charger for charger in query.all()}
+    
+    pricing_periods = defaultdict(list)
+    if embed and chargers:
+        query = db.query(PricingPeriod) \
+            .join(Charger, and_(
+                Charger.id == PricingPeriod.charger_id,
+                Charger.active_schedule_version == PricingPeriod.schedule_version)) \
+            .filter(PricingPeriod.charger_id == any_(uuid_array(list(chargers.keys())))) \
+            .order_by(PricingPeriod.start_time)
+        for period in query.all():
+            pricing_periods[period.charger_id].append(period)
+    
+    contents = []
+    not_found = []
+    for charger_id in requested_ids:
+        charger = chargers.get(parsed_ids.get(charger_id))
+        
+        if not charger:
+            not_found.append(charger_id)
+            continue
+        
+        current_pricing_period = None
+        if embed == ChargerEmbed.CURRENT_PRICING_PERIOD:
+            period = _find_current_pricing_period(pricing_periods[charger.id], charger.time_zone)
+            current_pricing_period = _pricing_period_dto(period) if period else None
+        
+        pricing_schedule = None
+        if embed == ChargerEmbed.PRICING_SCHEDULE:
+            pricing_schedule = [_pricing_period_dto(period) for period in pricing_periods[charger.id]]
+        
+        point = to_shape(charger.location)
+        coords = (point.x, point.y)
+        geo_point = GeoJSONPoint(
+            type="Point",
+            coordinates=coords
+        )
+        
+        charger_dto = PricedChargerDTO(
+            self=f"/chargers/{charger.id}",
+            id=str(charger.id),
+            region_id=str(charger.region_id),
+            location=geo_point,
+            time_zone=charger.time_zone,
+            in_use=charger.in_use,
+            charger_price_tier=charger.charger_price_tier,
+            price_status=charger.price_status.value,
+            operational=charger.operational,
+            current_pricing_period=current_pricing_period,
+            pricing_schedule=pricing_schedule
+        )
+        contents.append(charger_dto)
+    
+    result = ChargersMultiGetDTO(
+        self="/chargers/multi",
+        count=len(contents),
+        contents=contents,
+        not_found=not_found
+    )
+    
+    return result
+
+@traced
 def get_charger_pricing_schedule(charger_id: str, db: Session) -> list:
-    # Explicitly eager-load pricing periods for this specific query
-    charger = db.query(Charger).options(joinedload(Charger.pricing_periods)).filter(Charger.id == charger_id).first()
+    # Explicitly eager-load the periods of the active schedule version for this specific query,
+    # a repricing in progress stages its periods under another version
+    charger = db.query(Charger).options(joinedload(Charger.active_pricing_periods)).filter(Charger.id == charger_id).first()
     
     if not charger:
         raise HTTPException(status_code=404, detail="Charger not found")
 
-    if charger.price_status != ChargerPriceStatus.UP_TO_DATE:
-        raise HTTPException(status_code=503, detail="Charger pricing schedule is undergoing maintenance")
-
-    if charger.pricing_periods is None or len(charger.pricing_periods) == 0:
+    if charger.active_pricing_periods is None or len(charger.active_pricing_periods) == 0:
         raise HTTPException(status_code=404, detail="Charger pricing schedule not found")
 
-    pricing_periods = sorted(charger.pricing_periods, key=lambda x: x.start_time)
+    pricing_periods = sorted(charger.active_pricing_periods, key=lambda x: x.start_time)
     
     result = PricingScheduleDTO(
         self=f"/chargers/{charger.id}/pricing_schedule",
@@ -224,21 +359,15 @@ def get_charger_pricing_schedule(charger_id: str, db: Session) -> list:
     
     return result
 
+@traced
 def get_charger_current_pricing_period(charger_id: str, db: Session) -> PricingPeriodDTO | None:
-    # Explicitly eager-load pricing periods for this specific query
-    charger = db.query(Charger).options(joinedload(Charger.pricing_periods)).filter(Charger.id == charger_id).first()
-    charger_tz = pytz.timezone(charger.time_zone)
-    current_time = datetime.now(charger_tz)
+    # Explicitly eager-load the periods of the active schedule version for this specific query
+    charger = db.query(Charger).options(joinedload(Charger.active_pricing_periods)).filter(Charger.id == charger_id).first()
 
     if not charger:
         raise HTTPException(status_code=404, detail="Charger not found")
     
-    candidate_period = None
-    for period in charger.pricing_periods:
-        if is_time_in_interval(current_time.time(), period.start_time, period.end_time):
-            candidate_period = period
-            if period.status == PricingPeriodStatus.UP_TO_DATE:
-                break
+    candidate_period = _find_current_pricing_period(charger.active_pricing_periods, charger.time_zone)
     
     if candidate_period:     
         return PricingPeriodDTO(
@@ -254,8 +383,89 @@ def get_charger_current_pricing_period(charger_id: str, db: Session) -> PricingP
 
     raise HTTPException(status_code=404, detail="Current pricing period not found")
 
+def _find_current_pricing_period(pricing_periods: list[PricingPeriod], time_zone: str) -> PricingPeriod | None:
+    """
+    Find the pricing period covering the current time in the given time zone,
+    preferring an up to date period over a stale one.
+    """
+    charger_tz = pytz.timezone(time_zone)
+    current_time = datetime.now(charger_tz)
+    
+    candidate_period = None
+    for period in pricing_periods:
+        if is_time_in_interval(current_time.time(), period.start_time, period.end_time):
+            candidate_period = period
+            if period.status == PricingPeriodStatus.UP_TO_DATE:
+                break
+    
+    return candidate_period
+
+def _current_pricing_period_subquery():
+    """
+    Current pricing period of each charger as a LATERAL subquery, to outer join to the
+    chargers so that their current prices are fetched in the same statement.
+    
+    Same as _find_current_pricing_period, from the current time in the charger's time zone:
+    periods ending before they start wrap around midnight, and an up to date period is
+    preferred over a stale one. Between periods sharing a boundary, the one that started
+    most recently is picked.
+    """
+    local_time = cast(func.timezone(Charger.time_zone, func.now()), Time)
+    start_time = PricingPeriod.start_time
+    end_time = PricingPeriod.end_time
+    
+    covers_local_time = or_(
+        and_(start_time < end_time, start_time <= local_time, local_time <= end_time),
+        and_(start_time >= end_time, or_(local_time >= start_time, local_time <= end_time))
+    )
+    time_since_start = case(
+        (start_time <= local_time, local_time - start_time),
+        else_=local_time - start_time + timedelta(hours=24)
+    )
+    
+    return (
+        select(PricingPeriod)
+        .where(
+            PricingPeriod.charger_id == Charger.id,
+            PricingPeriod.schedule_version == Charger.active_schedule_version,
+            covers_local_time)
+        .order_by((PricingPeriod.status == PricingPeriodStatus.UP_TO_DATE).desc(), time_since_start)
+        .limit(1)
+        .lateral("current_pricing_period")
+    )
+
+def _current_pricing_periods(db: Session, charger_ids: list) -> dict:
+    """
+    Current pricing period of each of the given chargers, in a single query.
+    """
+    if not charger_ids:
+        return {}
+    
+    current_pricing_period = aliased(PricingPeriod, _current_pricing_period_subquery())
+    
+    query = db.query(Charger.id, current_pricing_period) \
+        .join(current_pricing_period, true()) \
+        .filter(Charger.id == any_(uuid_array(charger_ids)))
+    
+    return {charger_id: period for charger_id, period in query.all()}
+
+def _price_then_distance(charger_dto: DistancedChargerDTO) -> tuple:
+    # Chargers without a current pricing period come last
+    period = charger_dto.current_pricing_period
+    return (period is None, period.price_per_kwh if period else 0.0, charger_dto.distance_meters)
+
+@traced
 def get_pricing_period(pricing_period_id: str, db: Session) -> PricingPeriodDTO | None:
-    pricing_period = db.query(PricingPeriod).filter(PricingPeriod.id == pricing_period_id).first()
+    """
+    Get a pricing period of the active schedule of its charger. Periods keep their id when
+    their charger is repriced, so this is the period with its current price.
+    """
+    pricing_period = db.query(PricingPeriod) \
+        .join(Charger, and_(
+            Charger.id == PricingPeriod.charger_id,
+            Charger.active_schedule_version == PricingPeriod.schedule_version)) \
+        .filter(PricingPeriod.id == pricing_period_id) \
+        .first()
     
     if not pricing_period:
         return None
@@ -273,13 +483,17 @@ def get_pricing_period(pricing_period_id: str, db: Session) -> PricingPeriodDTO
     
     return result
 
+@traced
 def get_nearest_chargers(
         db: Session,
         lat: float, 
         lon: float, 
         count: int,
         operational_only: bool = True,
-        not_in_use_only: bool = False) -> ChargersDTO:
+        not_in_use_only: bool = False,
+        within_region_id: str | None = None,
+        include_current_price: bool = False,
+        sort_by_price: bool = False) -> DistancedChargersDTO:
     """
     Find the nearest chargers to a given location.
     
@@ -288,21 +502,26 @@ def get_nearest_chargers(
         lon: Longitude of the location
         count: Maximum number of chargers to return
         not_in_use_only: If True, only return chargers that are not in use
+        within_region_id: If provided, only return chargers within the boundary of this region
+        include_current_price: If True, include each charger's current pricing period, fetched in the same query
+        sort_by_price: If True, sort the nearest chargers by current price, then distance. Implies include_current_price
         db: Database session
         
     Returns:
-        ChargersDTO: DTO containing the nearest chargers
+        DistancedChargersDTO: DTO containing the nearest chargers
     """
+    include_current_price = include_current_price or sort_by_price
+    
+    if not within_region_id and charger_spatial_index.ready:
+        return _get_nearest_chargers_from_index(
+            db, lat, lon, count, operational_only, not_in_use_only, include_current_price, sort_by_price)
+    
     point = Point(lon, lat)
     wkb_point = from_shape(point, srid=4326)
+    distance = func.ST_DistanceSphere(Charger.location, wkb_point).label('distance')
+    current_pricing_period = aliased(PricingPeriod, _current_pricing_period_subquery())
     
-    query = db.query(
-        Charger,
-        func.ST_DistanceSphere(
-            Charger.location,
-            wkb_point
-        ).label('distance')
-    )
+    query = db.query(Charger, distance)
     
     if not_in_use_only:
         query = query.filter(Charger.in_use == False)
@@ -310,10 +529,26 @@ def get_nearest_chargers(
     if operational_only:
         query = query.filter(Charger.operational == True)
     
-    chargers_with_distance = query.order_by('distance').limit(count).all()
+    if within_region_id:
+        query = query.filter(_within_region_criterion(within_region_id))
+    
+    query = query.order_by('distance').limit(count)
+    
+    if include_current_price:
+        # Current pricing periods are only looked up for the nearest chargers, not for every charger
+        nearest = query.with_entities(Charger.id, distance).subquery()
+        query = db.query(Charger, nearest.c.distance, current_pricing_period) \
+            .join(nearest, Charger.id == nearest.c.id) \
+            .outerjoin(current_pricing_period, true()) \
+            .order_by(nearest.c.distance)
+    
+    chargers_with_distance = query.all()
     
     contents = []
-    for charger, distance in chargers_with_distance:
+    for row in chargers_with_distance:
+        charger, distance = row[0], row[1]
+        period = row[2] if include_current_price else None
+        
         point = to_shape(charger.location)
         coords = (point.x, point.y)
         geo_point = GeoJSONPoint(
@@ -331,10 +566,69 @@ def get_nearest_chargers(
             charger_price_tier=charger.charger_price_tier,
             price_status=charger.price_status.value,
             operational=charger.operational,
-            distance_meters=round(distance, 2)
+            distance_meters=round(distance, 2),
+            current_pricing_period=_pricing_period_dto(period) if period else None
+        )
+        contents.append(charger_dto)
+    
+    # Only the nearest chargers are sorted by price, not all chargers
+    if sort_by_price:
+        contents.sort(key=_price_then_distance)
+    
+    result = DistancedChargersDTO(
+        self=f"/chargers/nearest?lat={lat}&lon={lon}&count={count}&not_in_use_only={not_in_use_only}",
+        count=len(contents),
+        contents=contents
+    )
+    
+    return result
+
+def _get_nearest_chargers_from_index(
+        db: Session,
+        lat: float,
+        lon: float,
+        count: int,
+        operational_only: bool,
+        not_in_use_only: bool,
+        include_current_price: bool,
+        sort_by_price: bool) -> DistancedChargersDTO:
+    """
+    Same as get_nearest_chargers, answered from the in-memory charger spatial index.
+    Current prices are fetched for all nearest chargers in a single query.
+    """
+    nearest_chargers = charger_spatial_index.nearest(lat, lon, count, operational_only, not_in_use_only)
+    
+    current_pricing_periods = {}
+    if include_current_price:
+        current_pricing_periods = _current_pricing_periods(db, [charger.id for charger, _ in nearest_chargers])
+    
+    contents = []
+    for charger, distance in nearest_chargers:
+        geo_point = GeoJSONPoint(
+            type="Point",
+            coordinates=(charger.longitude, charger.latitude)
+        )
+        
+        period = current_pricing_periods.get(uuid.UUID(charger.id))
+        
+        charger_dto = DistancedChargerDTO(
+            self=f"/chargers/{charger.id}",
+            id=charger.id,
+            region_id=charger.region_id,
+            location=geo_point,
+            time_zone=charger.time_zone,
+            in_use=charger.in_use,
+            charger_price_tier=charger.charger_price_tier,
+            price_status=charger.price_status,
+            operational=charger.operational,
+            distance_meters=round(distance, 2),
+            current_pricing_period=_pricing_period_dto(period) if period else None
         )
         contents.append(charger_dto)
     
+    if sort_by_price:
+        contents.sort(key=_price_then_distance)
+    
     result = DistancedChargersDTO(
         self=f"/chargers/nearest?lat={lat}&lon={lon}&count={count}&not_in_use_only={not_in_use_only}",
         count=len(contents),
@@ -343,12 +637,17 @@ def get_nearest_chargers(
     
     return result
 
+@traced
 def get_pricing_periods(db: Session, charger_id: str, status: PricingPeriodStatus):
     """
-    Get all pricing periods for a charger.
+    Get all pricing periods of the active schedule of a charger.
     If status is provided, only return pricing periods with that status.
     """
-    query = db.query(PricingPeriod).filter(PricingPeriod.charger_id == charger_id)
+    query = db.query(PricingPeriod) \
+        .join(Charger, and_(
+            Charger.id == PricingPeriod.charger_id,
+            Charger.active_schedule_version == PricingPeriod.schedule_version)) \
+        .filter(PricingPeriod.charger_id == charger_id)
     
     if status:
         query = query.filter(PricingPeriod.status == status)
@@ -375,6 +674,7 @@ def get_pricing_periods(db: Session, charger_id: str, status: PricingPeriodStatu
 
     return result
 
+@traced
 def update_charger(charger_id: str, db: Session, charger_patch: PatchChargerDTO) -> ChargerDTO | None:
     """
     Update a charger's price status or price tier.
@@ -387,10 +687,18 @@ def update_charger(charger_id: str, db: Session, charger_patch: PatchChargerDTO)
     if charger_patch.price_status:
         charger.price_status = ChargerPriceStatus(charger_patch.price_status)
     
+    tier_changed = bool(charger_patch.charger_price_tier) and \
+        charger_patch.charger_price_tier != charger.charger_price_tier
+    
     if charger_patch.charger_price_tier:
         charger.charger_price_tier = charger_patch.charger_price_tier
     
-    db.commit()
+    if tier_changed:
+        # The new tier is committed by the repricing, with the schedule priced from it
+        db.flush()
+        reprice_chargers(db, charger_id=str(charger.id))
+    else:
+        db.commit()
     
     point = to_shape(charger.location)
     coords = (point.x, point.y)
@@ -413,3 +721,174 @@ def update_charger(charger_id: str, db: Session, charger_patch: PatchChargerDTO)
     
     return result
 
+@traced
+def update_region(region_id: str, db: Session, region_patch: PatchRegionDTO) -> RegionDTO | None:
+    """
+    Update a region's price tier, repricing the pricing schedules of all its chargers.
+    """
+    region = db.query(Region).filter(Region.id == region_id).first()
+    
+    if not region:
+        return None
+    
+    tier_changed = bool(region_patch.region_price_tier) and \
+        region_patch.region_price_tier != region.region_price_tier
+    
+    if region_patch.region_price_tier:
+        region.region_price_tier = region_patch.region_price_tier
+    
+    if region_patch.boundary:
+        region.boundary = from_shape(_region_boundary(region_patch.boundary), srid=4326)
+        db.flush()
+        # In the same transaction as the boundary, so that they never disagree
+        refresh_region_subdivisions(db, region_id=str(region.id))
+    
+    if tier_changed:
+        # The changes are committed by the repricing, with the schedules priced from the new tier
+        db.flush()
+        reprice_chargers(db, region_id=str(region.id))
+    else:
+        db.commit()
+    
+    result = RegionDTO(
+        self=f"/regions/{region.id}",
+        id=str(region.id),
+        name=region.name,
+        state_code=region.state_code,
+        region_price_tier=region.region_price_tier
+    )
+    
+    return result
+
+def _charger_scope_criteria(charger_id: str | None, region_id: str | None, state_code: str | None) -> list:
+    """
+    Filter criteria selecting the chargers of a charger, region and/or state scope.
+    """
+    criteria = []
+    
+    if charger_id:
+        criteria.append(Charger.id == charger_id)
+    
+    if region_id:
+        criteria.append(Charger.region_id == region_id)
+    
+    if state_code:
+        criteria.append(Charger.region_id.in_(
+            select(Region.id).where(func.lower(Region.state_code) == state_code.lower())
+        ))
+    
+    return criteria
+
+@traced
+def reprice_chargers(
+        db: Session,
+        charger_id: str | None = None,
+        region_id: str | None = None,
+        state_code: str | None = None) -> RepricingResultDTO:
+    """
+    Recompute the price per kWh of every pricing period of the chargers in scope,
+    from the current region and charger price tiers.
+    
+    The repriced periods are staged under a new schedule version with a single
+    INSERT ... SELECT from the active schedules, and published by switching the chargers
+    to it in the same transaction. Schedules stay readable throughout, readers get the
+    previous prices until the switch is committed.
+    Chargers whose schedule was published by another writer meanwhile are repriced again
+    from it, and reported as skipped if that keeps happening.
+    Schedule versions no longer in use are then deleted.
+    """
+    scope = _charger_scope_criteria(charger_id, region_id, state_code)
+    
+    if not scope:
+        raise HTTPException(status_code=400, detail="A charger, region or state code must be provided")
+    
+    charger_count, pricing_period_count, skipped_charger_count = reprice_schedules(db, scope)
+    
+    result = RepricingResultDTO(
+        charger_count=charger_count,
+        pricing_period_count=pricing_period_count,
+        skipped_charger_count=skipped_charger_count
+    )
+    
+    return result
+
+def _region_boundary(geojson: dict) -> MultiPolygon:
+    """
+    Parse a GeoJSON Polygon or MultiPolygon into a valid MultiPolygon.
+    """
+    try:
+        geometry = shape(geojson)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Region boundary must be a GeoJSON geometry")
+    
+    if geometry.geom_type not in ("Polygon", "MultiPolygon"):
+        raise HTTPException(status_code=400, detail="Region boundary must be a Polygon or a MultiPolygon")
+    
+    geometry = make_valid(geometry)
+    
+    if geometry.geom_type == "Polygon":
+        return MultiPolygon([geometry])
+    
+    if geometry.geom_type == "MultiPolygon":
+        return geometry
+    
+    # Fixing an invalid polygon can give a collection, with lines along self-intersections
+    polygons = []
+    for part in geometry.geoms:
+        if part.geom_type == "Polygon":
+            polygons.append(part)
+        elif part.geom_type == "MultiPolygon":
+            polygons.extend(part.geoms)
+    
+    return MultiPolygon(polygons)
+
+def _within_region_criterion(region_id: str):
+    """
+    Filter criterion selecting the chargers located within the boundary of a region,
+    whatever region they are assigned to.
+    """
+    return exists().where(
+        RegionSubdivision.region_id == region_id,
+        func.ST_Intersects(RegionSubdivision.geometry, Charger.location)
+    )
+
+@traced
+def get_region_containing_point(db: Session, lat: float, lon: float) -> RegionDTO | None:
+    """
+    Find the region whose boundary contains a location, using the spatial index
+    of the subdivided region boundaries.
+    """
+    point = from_shape(Point(lon, lat), srid=4326)
+    
+    region = db.query(Region) \
+        .join(RegionSubdivision, RegionSubdivision.region_id == Region.id) \
+        .filter(func.ST_Intersects(RegionSubdivision.geometry, point)) \
+        .first()
+    
+    if not region:
+        return None
+    
+    result = RegionDTO(
+        self=f"/regions/{region.id}",
+        id=str(region.id),
+        name=region.name,
+        state_code=region.state_code,
+        region_price_tier=region.region_price_tier
+    )
+    
+    return result
+
+@traced
+def get_region_boundary(region_id: str, db: Session) -> dict | None:
+    """
+    Get the boundary of a region as a GeoJSON geometry.
+    """
+    region = db.query(Region).filter(Region.id == region_id).first()
+    
+    if not region:
+        return None
+    
+    if region.boundary is None:
+        raise HTTPException(status_code=404, detail="Region boundary not found")
+    
+    return mapping(to_shape(region.boundary))
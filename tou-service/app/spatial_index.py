@@ -0,0 +1,293 @@
+import logging
+import math
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import shapely
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.database.database import SessionLocal
+from app.database.models import Charger
+
+logger = logging.getLogger(__name__)
+
+# Radius of the sphere ST_DistanceSphere measures on for SRID 4326, (2a + b) / 3 of WGS 84
+EARTH_RADIUS_METERS = 6371008.771415059
+# Radius of the first search around a location, multiplied until enough chargers are found
+INITIAL_SEARCH_RADIUS_METERS = 2000.0
+SEARCH_RADIUS_GROWTH = 4.0
+# Changed chargers are kept apart from the tree, and scanned exhaustively, until there
+# are this many of them or this share of the indexed chargers, and the tree is rebuilt
+MAX_DELTA_SIZE = 1024
+MAX_DELTA_RATIO = 0.05
+# updated_at is the start time of the updating transaction, not its commit time. Rows
+# stamped before a refresh may still be committed after it by a transaction open during it,
+# so the next refresh starts from the start of the oldest transaction open in the database.
+OLDEST_OPEN_TRANSACTION_START = text(
+    "SELECT least(min(xact_start), statement_timestamp()) FROM pg_stat_activity "
+    "WHERE datname = current_database() AND pid <> pg_backend_pid() AND xact_start IS NOT NULL"
+)
+
+@dataclass
+class IndexedCharger:
+    id: str
+    region_id: str
+    longitude: float
+    latitude: float
+    time_zone: str
+    in_use: bool
+    charger_price_tier: int
+    price_status: str
+    operational: bool
+
+def sphere_distances(lat: float, lon: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Great circle distances in meters, computed as ST_DistanceSphere does.
+    """
+    lat1 = math.radians(lat)
+    lat2 = np.radians(latitudes)
+    d_lon = np.radians(longitudes) - math.radians(lon)
+
+    a = np.cos(lat2) * np.sin(d_lon)
+    b = math.cos(lat1) * np.sin(lat2) - math.sin(lat1) * np.cos(lat2) * np.cos(d_lon)
+    c = math.sin(lat1) * np.sin(lat2) + math.cos(lat1) * np.cos(lat2) * np.cos(d_lon)
+
+    return EARTH_RADIUS_METERS * np.arctan2(np.sqrt(a * a + b * b), c)
+
+def _search_boxes(lat: float, lon: float, radius: float) -> list[tuple[float, float, float, float]] | None:
+    """
+    Longitude/latitude boxes covering all locations within radius meters of a location,
+    None if the search has to cover the whole earth.
+    """
+    angle = radius / EARTH_RADIUS_METERS
+    if angle >= math.pi / 2:
+        return None
+
+    d_lat = math.degrees(angle)
+    min_lat = lat - d_lat
+    max_lat = lat + d_lat
+
+    # Around a pole, the search covers all longitudes
+    if min_lat <= -90 or max_lat >= 90 or math.sin(angle) >= math.cos(math.radians(lat)):
+        return [(-180.0, max(min_lat, -90.0), 180.0, min(max_lat, 90.0))]
+
+    d_lon = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(lat))))
+    min_lon = lon - d_lon
+    max_lon = lon + d_lon
+
+    # Across the antimeridian, the search is split in two boxes
+    if min_lon < -180:
+        return [(min_lon + 360, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+    if max_lon > 180:
+        return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon - 360, max_lat)]
+
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+class ChargerSpatialIndex:
+    """
+    In-memory index of charger locations and flags, answering nearest charger queries
+    without a database round trip, with the same results as ST_DistanceSphere.
+
+    Chargers are held in a Shapely STRtree over their coordinates. A nearest charger
+    query looks up the chargers in boxes around the location, growing until they hold
+    enough chargers within the searched radius, and ranks them by great circle distance.
+
+    The index is refreshed incrementally from the chargers updated since the last refresh.
+    Changed flags are updated in place, while moved and new chargers are kept in a small
+    delta scanned exhaustively, merged into a rebuilt tree once it grows.
+    Only the refresh thread changes the index, queries read it under a lock.
+    """
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.Lock()
+        self._chargers: list[IndexedCharger] = []
+        self._positions: dict[str, int] = {}
+        self._longitudes = np.empty(0)
+        self._latitudes = np.empty(0)
+        self._operational = np.empty(0, dtype=bool)
+        self._in_use = np.empty(0, dtype=bool)
+        self._alive = np.empty(0, dtype=bool)
+        self._tree = shapely.STRtree([])
+        self._delta: dict[str, IndexedCharger] = {}
+        self._watermark: datetime | None = None
+        self._refresh_thread = None
+        self._stop_refresh = threading.Event()
+
+    def start(self, refresh_interval: float):
+        """
+        Refresh the index every refresh_interval seconds, from a background thread.
+        """
+        def refresh_periodically():
+            while True:
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception("Charger spatial index refresh failed")
+                if self._stop_refresh.wait(refresh_interval):
+                    return
+
+        self._stop_refresh.clear()
+        self._refresh_thread = threading.Thread(target=refresh_periodically, name="charger-spatial-index", daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self):
+        self._stop_refresh.set()
+        if self._refresh_thread:
+            self._refresh_thread.join()
+            self._refresh_thread = None
+
+    def refresh(self, db: Session | None = None):
+        """
+        Apply the chargers updated since the last refresh, or load all chargers on the first one.
+        """
+        owns_session = db is None
+        db = db or SessionLocal()
+        try:
+            # Read before the chargers, every update not visible to their query is stamped after it
+            horizon = db.execute(OLDEST_OPEN_TRANSACTION_START).scalar_one()
+
+            query = select(
+                Charger.id,
+                Charger.region_id,
+                func.ST_X(Charger.location).label("longitude"),
+                func.ST_Y(Charger.location).label("latitude"),
+                Charger.time_zone,
+                Charger.in_use,
+                Charger.charger_price_tier,
+                Charger.price_status,
+                Charger.operational,
+                Charger.updated_at,
+            )
+            if self._watermark:
+                query = query.where(Charger.updated_at >= self._watermark)
+
+            rows = db.execute(query).all()
+        finally:
+            if owns_session:
+                db.close()
+
+        chargers = [
+            IndexedCharger(
+                id=str(row.id),
+                region_id=str(row.region_id),
+                longitude=row.longitude,
+                latitude=row.latitude,
+                time_zone=row.time_zone,
+                in_use=row.in_use,
+                charger_price_tier=row.charger_price_tier,
+                price_status=row.price_status.value,
+                operational=row.operational
+            ) for row in rows
+        ]
+        self._apply(chargers)
+
+        if rows:
+            # Updates stamped after the latest one fetched, or committed by transactions open
+            # during the refresh, are fetched by the next one
+            self._watermark = min(max(row.updated_at for row in rows), horizon)
+        self.ready = True
+
+    def _apply(self, chargers: list[IndexedCharger]):
+        delta = dict(self._delta)
+
+        with self._lock:
+            for charger in chargers:
+                position = self._positions.get(charger.id)
+
+                if position is not None and self._alive[position] \
+                        and self._longitudes[position] == charger.longitude \
+                        and self._latitudes[position] == charger.latitude:
+                    self._chargers[position] = charger
+                    self._operational[position] = charger.operational
+                    self._in_use[position] = charger.in_use
+                    continue
+
+                if position is not None:
+                    self._alive[position] = False
+                delta[charger.id] = charger
+
+            self._delta = delta
+
+        if len(delta) > max(MAX_DELTA_SIZE, MAX_DELTA_RATIO * len(self._chargers)):
+            self._rebuild()
+
+    def _rebuild(self):
+        # Built outside of the lock, only the refresh thread changes the index
+        chargers = [charger for charger, alive in zip(self._chargers, self._alive) if alive]
+        chargers.extend(self._delta.values())
+
+        longitudes = np.array([charger.longitude for charger in chargers], dtype=float)
+        latitudes = np.array([charger.latitude for charger in chargers], dtype=float)
+        tree = shapely.STRtree(shapely.points(longitudes, latitudes))
+
+        with self._lock:
+            self._chargers = chargers
+            self._positions = {charger.id: position for position, charger in enumerate(chargers)}
+            self._longitudes = longitudes
+            self._latitudes = latitudes
+            self._operational = np.array([charger.operational for charger in chargers], dtype=bool)
+            self._in_use = np.array([charger.in_use for charger in chargers], dtype=bool)
+            self._alive = np.ones(len(chargers), dtype=bool)
+            self._tree = tree
+            self._delta = {}
+
+    def nearest(
+            self,
+            lat: float,
+            lon: float,
+            count: int,
+            operational_only: bool = True,
+            not_in_use_only: bool = False) -> list[tuple[IndexedCharger, float]]:
+        """
+        Find the nearest chargers to a location, with their distance in meters.
+        """
+        if count <= 0:
+            return []
+
+        with self._lock:
+            eligible = self._alive
+            if operational_only:
+                eligible = eligible & self._operational
+            if not_in_use_only:
+                eligible = eligible & ~self._in_use
+
+            delta = [
+                charger for charger in self._delta.values()
+                if (charger.operational or not operational_only) and (not charger.in_use or not not_in_use_only)
+            ]
+            delta_distances = sphere_distances(
+                lat, lon,
+                np.array([charger.latitude for charger in delta], dtype=float),
+                np.array([charger.longitude for charger in delta], dtype=float))
+
+            radius = INITIAL_SEARCH_RADIUS_METERS
+            while True:
+                boxes = _search_boxes(lat, lon, radius)
+
+                if boxes is None:
+                    positions = np.flatnonzero(eligible)
+                else:
+                    positions = np.unique(self._tree.query(shapely.box(*np.array(boxes).T))[1])
+                    positions = positions[eligible[positions]]
+
+                distances = sphere_distances(lat, lon, self._latitudes[positions], self._longitudes[positions])
+
+                found = np.count_nonzero(distances <= radius) + np.count_nonzero(delta_distances <= radius)
+                if boxes is None or found >= count:
+                    break
+
+                radius *= SEARCH_RADIUS_GROWTH
+
+            nearest = np.argsort(distances, kind="stable")[:count]
+            candidates = [(self._chargers[positions[i]], distances[i]) for i in nearest]
+
+        candidates.extend(zip(delta, delta_distances))
+        candidates.sort(key=lambda candidate: candidate[1])
+
+        return [(charger, float(distance)) for charger, distance in candidates[:count]]
+
+charger_spatial_index = ChargerSpatialIndex()
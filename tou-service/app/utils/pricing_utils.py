@@ -0,0 +1,37 @@
+import numpy as np
+from sqlalchemy import Float, Numeric, cast
+from sqlalchemy.sql import func
+
+REGION_TIER_RATE = 0.05
+CHARGER_TIER_RATE = 0.02
+DEMAND_INDEX_RATE = 0.03
+
+def compute_price_per_kwh(region_price_tier: int, charger_price_tier: int, demand_index: int) -> float:
+    """
+    Price per kWh of a pricing period, derived from the region tier, the charger tier
+    and the demand index of the period.
+    """
+    return round(region_price_tier * REGION_TIER_RATE + \
+        charger_price_tier * CHARGER_TIER_RATE + \
+        demand_index * DEMAND_INDEX_RATE,
+        2)
+
+def compute_prices_per_kwh(region_price_tiers: np.ndarray, charger_price_tiers: np.ndarray, demand_indexes: np.ndarray) -> np.ndarray:
+    """
+    Vectorized compute_price_per_kwh, for batch repricing.
+    """
+    return np.round(region_price_tiers * REGION_TIER_RATE + \
+        charger_price_tiers * CHARGER_TIER_RATE + \
+        demand_indexes * DEMAND_INDEX_RATE,
+        2)
+
+def price_per_kwh_expression(region_price_tier, charger_price_tier, demand_index):
+    """
+    SQL equivalent of compute_price_per_kwh, for set-based repricing.
+    Postgres only rounds numerics to a fixed number of digits, hence the casts.
+    """
+    price = region_price_tier * REGION_TIER_RATE + \
+        charger_price_tier * CHARGER_TIER_RATE + \
+        demand_index * DEMAND_INDEX_RATE
+
+    return cast(func.round(cast(price, Numeric), 2), Float)
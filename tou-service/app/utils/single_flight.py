@@ -0,0 +1,45 @@
+import asyncio
+from typing import Any, Callable, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls: while a call for a key is in flight, further calls
+    for the same key wait for its result instead of running their own.
+    Nothing is cached, the first call for a key made after the previous one completed runs again.
+    
+    Calls are synchronous functions, run in the thread pool.
+    """
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+    
+    async def run(self, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        self.calls += 1
+        
+        if not self.enabled:
+            return await run_in_threadpool(fn, *args)
+        
+        future = self._in_flight.get(key)
+        
+        if future is None:
+            future = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._complete(key, done))
+        else:
+            self.coalesced += 1
+        
+        # Shielded, so that a cancelled request does not cancel the call shared with other requests
+        return await asyncio.shield(future)
+    
+    def _complete(self, key: Hashable, future: asyncio.Future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        
+        # Mark the exception as retrieved, in case every waiting request was cancelled
+        if not future.cancelled():
+            future.exception()
@@ -0,0 +1,192 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+@dataclass
+class SqlStatement:
+    statement: str
+    duration: float
+    # Rows fetched by a query or affected by a DML statement, -1 if unknown
+    rowcount: int
+    # Innermost traced function executing the statement, if any
+    function: str | None
+
+@dataclass
+class TracedCall:
+    function: str
+    duration: float
+    # CPU time of the thread running the call
+    cpu_time: float
+
+@dataclass
+class SqlTrace:
+    """
+    SQL statements executed while the trace is active, and the outermost traced
+    function calls made within it.
+    """
+    statements: list[SqlStatement] = field(default_factory=list)
+    # Statement being executed, per thread id
+    executing: dict[int, str] = field(default_factory=dict)
+    calls: list[TracedCall] = field(default_factory=list)
+    # Ids of the threads running a traced function call of the trace
+    calling_threads: set[int] = field(default_factory=set)
+
+    @property
+    def query_count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def row_count(self) -> int:
+        return sum(max(statement.rowcount, 0) for statement in self.statements)
+
+    def query_counts_by_function(self) -> dict[str, int]:
+        counts = {}
+        for statement in self.statements:
+            name = statement.function or "<unattributed>"
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+# Traces active in the current context, and in the threads it is copied to
+_context_traces: ContextVar[tuple[SqlTrace, ...]] = ContextVar("sql_traces", default=())
+# Traces recording the statements of every context, for tests
+_global_traces: list[SqlTrace] = []
+_current_function: ContextVar[str | None] = ContextVar("sql_traced_function", default=None)
+_traced_engines = set()
+
+def _active_traces() -> tuple[SqlTrace, ...]:
+    traces = _context_traces.get()
+    if _global_traces:
+        traces = traces + tuple(_global_traces)
+    return traces
+
+@contextmanager
+def sql_trace():
+    """
+    Record the SQL statements executed within the block, including by synchronous
+    service calls run in the thread pool from it.
+    Traces can be nested, each of them records every statement executed within it.
+    """
+    trace = SqlTrace()
+    token = _context_traces.set(_context_traces.get() + (trace,))
+    try:
+        yield trace
+    finally:
+        _context_traces.reset(token)
+
+def traced(fn):
+    """
+    Attribute the SQL statements executed by a function to it.
+    Within a trace, calls that are not nested in another traced call are also timed,
+    and their thread recorded while they run.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        traces = () if _current_function.get() else _active_traces()
+        token = _current_function.set(fn.__name__)
+
+        if not traces:
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_function.reset(token)
+
+        thread_id = threading.get_ident()
+        for trace in traces:
+            trace.calling_threads.add(thread_id)
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            call = TracedCall(fn.__name__, time.perf_counter() - start, time.thread_time() - cpu_start)
+            _current_function.reset(token)
+            for trace in traces:
+                trace.calling_threads.discard(thread_id)
+                trace.calls.append(call)
+
+    return wrapper
+
+@contextmanager
+def query_budget(max_queries: int, engine: Engine | None = None):
+    """
+    Test helper, failing if more than max_queries SQL statements are executed within
+    the block, from any thread. Meant to wrap a single request of a test client, e.g.
+
+        with query_budget(2):
+            client.get(f"/chargers/{charger_id}/pricing-schedule")
+    """
+    if engine is None:
+        from app.database.database import engine as default_engine
+        engine = default_engine
+
+    install_sql_tracing(engine)
+
+    trace = SqlTrace()
+    _global_traces.append(trace)
+    try:
+        yield trace
+    finally:
+        _global_traces.remove(trace)
+
+    if trace.query_count > max_queries:
+        statements = "\n".join(
+            f"  [{statement.function or '<unattributed>'}] {' '.join(statement.statement.split())}"
+            for statement in trace.statements
+        )
+        raise QueryBudgetExceeded(
+            f"{trace.query_count} SQL statements executed, over the budget of {max_queries}:\n{statements}")
+
+def install_sql_tracing(engine: Engine):
+    """
+    Register the engine event listeners feeding the active SQL traces, once per engine.
+    Outside of a trace, the listeners return right away.
+    """
+    if engine in _traced_engines:
+        return
+
+    _traced_engines.add(engine)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    traces = _active_traces()
+
+    if not traces:
+        return
+
+    conn.info.setdefault("sql_trace_start", []).append(time.perf_counter())
+    for trace in traces:
+        trace.executing[threading.get_ident()] = statement
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    traces = _active_traces()
+
+    if not traces or not conn.info.get("sql_trace_start"):
+        return
+
+    duration = time.perf_counter() - conn.info["sql_trace_start"].pop()
+    executed = SqlStatement(statement, duration, cursor.rowcount, _current_function.get())
+    for trace in traces:
+        trace.executing.pop(threading.get_ident(), None)
+        trace.statements.append(executed)
+
+def _handle_error(exception_context):
+    traces = _active_traces()
+
+    if not traces:
+        return
+
+    for trace in traces:
+        trace.executing.pop(threading.get_ident(), None)
+    if exception_context.connection is not None and exception_context.connection.info.get("sql_trace_start"):
+        exception_context.connection.info["sql_trace_start"].pop()
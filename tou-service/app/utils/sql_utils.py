@@ -0,0 +1,8 @@
+from sqlalchemy import cast, literal
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+def uuid_array(ids: list):
+    """
+    Bind a list of UUIDs as a single uuid[] parameter, for use with = ANY(...).
+    """
+    return cast(literal([str(id) for id in ids], ARRAY(UUID(as_uuid=False))), ARRAY(UUID(as_uuid=True)))
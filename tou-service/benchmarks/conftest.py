@@ -0,0 +1,114 @@
+import random
+import uuid
+from datetime import time
+from functools import lru_cache
+
+import pytest
+from geoalchemy2.shape import from_shape
+from shapely.geometry import Point
+
+from app.database.models import Charger, ChargerPriceStatus, PricingPeriod, PricingPeriodStatus
+
+# Number of rows returned by the fake database, per benchmark
+SIZES = [1, 1_000, 100_000]
+
+TIME_ZONES = ["America/Los_Angeles", "America/Phoenix", "America/New_York", "UTC"]
+
+# Boundaries of a typical schedule, the last period wrapping around midnight
+SCHEDULE_HOURS = [0, 6, 10, 16, 21, 24]
+
+class FakeQuery:
+    """
+    Query returning canned rows, whatever its filters, so that benchmarks measure the
+    Python side of service functions without a database.
+    """
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def join(self, *target):
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def options(self, *options):
+        return self
+
+    def order_by(self, *clauses):
+        return self
+
+    def limit(self, limit):
+        return FakeQuery(self.rows[:limit])
+
+    def all(self):
+        return list(self.rows)
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+class FakeSession:
+    """
+    Session whose queries return the canned rows of the first queried entity.
+    """
+    def __init__(self, rows_by_entity: dict):
+        self.rows_by_entity = rows_by_entity
+
+    def query(self, entity, *entities):
+        return FakeQuery(self.rows_by_entity[entity])
+
+@lru_cache
+def make_pricing_periods(count: int) -> list[PricingPeriod]:
+    """
+    Transient pricing periods of a single charger, following a typical daily schedule.
+    """
+    rng = random.Random(count)
+    charger_id = uuid.UUID(int=rng.getrandbits(128))
+    return [_pricing_period(charger_id, i, rng) for i in range(count)]
+
+def _pricing_period(charger_id: uuid.UUID, i: int, rng: random.Random) -> PricingPeriod:
+    period_count = len(SCHEDULE_HOURS) - 1
+    return PricingPeriod(
+        id=uuid.UUID(int=rng.getrandbits(128)),
+        charger_id=charger_id,
+        start_time=time(SCHEDULE_HOURS[i % period_count]),
+        end_time=time(SCHEDULE_HOURS[i % period_count + 1] % 24),
+        demand_index=rng.randint(1, 5),
+        price_per_kwh=round(rng.uniform(0.2, 0.6), 2),
+        status=PricingPeriodStatus.UP_TO_DATE
+    )
+
+def _charger(rng: random.Random) -> Charger:
+    return Charger(
+        id=uuid.UUID(int=rng.getrandbits(128)),
+        region_id=uuid.UUID(int=rng.getrandbits(128)),
+        location=from_shape(Point(rng.uniform(-122.4, -121.5), rng.uniform(37.4, 38.1)), srid=4326),
+        time_zone=rng.choice(TIME_ZONES),
+        in_use=rng.random() < 0.3,
+        charger_price_tier=rng.randint(1, 5),
+        price_status=ChargerPriceStatus.UP_TO_DATE,
+        operational=True
+    )
+
+@lru_cache
+def make_chargers(count: int) -> list[Charger]:
+    """
+    Transient chargers around the Bay Area, built once per size and shared by benchmarks.
+    """
+    rng = random.Random(count)
+    return [_charger(rng) for _ in range(count)]
+
+@pytest.fixture(params=SIZES, ids=lambda size: f"{size}_rows")
+def size(request) -> int:
+    return request.param
+
+@lru_cache
+def make_scheduled_chargers(count: int) -> list[Charger]:
+    """
+    Transient chargers with their daily pricing schedule attached, built apart from those
+    of make_chargers, so that benchmarks do not share state.
+    """
+    rng = random.Random(count)
+    chargers = [_charger(rng) for _ in range(count)]
+    for charger in chargers:
+        charger.active_pricing_periods = [_pricing_period(charger.id, i, rng) for i in range(len(SCHEDULE_HOURS) - 1)]
+    return chargers
@@ -0,0 +1,47 @@
+import itertools
+
+import app.service as service
+from app.database.models import Charger, PricingPeriod
+
+from conftest import FakeQuery, FakeSession, make_chargers, make_pricing_periods, make_scheduled_chargers
+
+def test_get_chargers(benchmark, size):
+    db = FakeSession({Charger: make_chargers(size)})
+
+    result = benchmark(service.get_chargers, db, True, False, None)
+    assert result.count == size
+
+def test_get_nearest_chargers(benchmark, size):
+    chargers = make_chargers(size)
+    rows = [(charger, i * 10.0) for i, charger in enumerate(chargers)]
+    db = FakeSession({Charger: rows})
+
+    result = benchmark(service.get_nearest_chargers, db, 37.8, -122.2, size)
+    assert result.count == size
+
+def test_get_pricing_periods(benchmark, size):
+    pricing_periods = make_pricing_periods(size)
+    db = FakeSession({PricingPeriod: pricing_periods})
+
+    result = benchmark(service.get_pricing_periods, db, str(pricing_periods[0].charger_id), None)
+    assert result.count == size
+
+class CyclingSession:
+    """
+    Session returning the next charger on every query, so that successive lookups
+    go through different time zones.
+    """
+    def __init__(self, chargers: list[Charger]):
+        self.chargers = itertools.cycle(chargers)
+
+    def query(self, entity, *entities):
+        return FakeQuery([next(self.chargers)])
+
+def test_get_charger_current_pricing_period(benchmark, size):
+    chargers = make_scheduled_chargers(size)
+    db = CyclingSession(chargers)
+
+    def lookup_all():
+        return [service.get_charger_current_pricing_period(str(charger.id), db) for charger in chargers]
+
+    benchmark(lookup_all)
@@ -0,0 +1,32 @@
+import random
+from datetime import time
+
+from geoalchemy2.shape import to_shape
+
+from app.utils.time_utils import is_time_in_interval
+
+from conftest import make_chargers
+
+def test_is_time_in_interval(benchmark, size):
+    rng = random.Random(size)
+    intervals = [
+        (time(rng.randrange(24), rng.randrange(60)), time(rng.randrange(24)), time(rng.randrange(24)))
+        for _ in range(size)
+    ]
+
+    def check_all():
+        return [is_time_in_interval(check_time, start_time, end_time) for check_time, start_time, end_time in intervals]
+
+    benchmark(check_all)
+
+def test_to_shape_coordinates(benchmark, size):
+    locations = [charger.location for charger in make_chargers(size)]
+
+    def extract_all():
+        coordinates = []
+        for location in locations:
+            point = to_shape(location)
+            coordinates.append((point.x, point.y))
+        return coordinates
+
+    benchmark(extract_all)
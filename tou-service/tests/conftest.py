@@ -0,0 +1,85 @@
+import os
+import random
+
+import pytest
+from geoalchemy2.shape import from_shape
+from shapely.geometry import Point
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+# Tests needing a database run against the one named by TEST_DB_NAME only, never against
+# the DB_NAME of the service, as importing the app drops and recreates the schema
+TEST_DB_NAME = os.environ.get("TEST_DB_NAME")
+if TEST_DB_NAME:
+    os.environ["DB_NAME"] = TEST_DB_NAME
+
+# The background refresh of the spatial index would count against the query budgets
+os.environ["SPATIAL_INDEX_ENABLED"] = "false"
+
+from app.database.database import SessionLocal, engine
+from app.database.models import Charger, ChargerPriceStatus, Region
+
+# Enough chargers for a query per charger to blow any budget
+CHARGER_COUNT = 25
+
+def _database_available() -> bool:
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except OperationalError:
+        return False
+    return True
+
+def _seed() -> list[str]:
+    """
+    Chargers of a single region, each with a random daily pricing schedule.
+    """
+    from app.data_gen import generate_random_price_schedule
+
+    rng = random.Random(0)
+    db = SessionLocal()
+    try:
+        region = Region(name="Alameda County", state_code="CA", region_price_tier=4)
+        db.add(region)
+        db.commit()
+
+        chargers = [
+            Charger(
+                region_id=region.id,
+                location=from_shape(Point(-122.3 + rng.random() * 0.2, 37.7 + rng.random() * 0.2), srid=4326),
+                time_zone="America/Los_Angeles",
+                in_use=False,
+                charger_price_tier=rng.randint(1, 5),
+                price_status=ChargerPriceStatus.UP_TO_DATE,
+                operational=True
+            ) for _ in range(CHARGER_COUNT)
+        ]
+        db.add_all(chargers)
+        db.commit()
+
+        for charger in chargers:
+            db.add_all(generate_random_price_schedule(charger, region))
+        db.commit()
+
+        return [str(charger.id) for charger in chargers]
+    finally:
+        db.close()
+
+@pytest.fixture(scope="session")
+def client():
+    if not TEST_DB_NAME:
+        pytest.skip("No test database, set TEST_DB_NAME to a disposable PostGIS database")
+    if not _database_available():
+        pytest.skip(f"Test database {TEST_DB_NAME} is not reachable, see DB_HOST, DB_PORT, DB_USER and DB_PASSWORD")
+
+    from fastapi.testclient import TestClient
+
+    # Importing the app drops and recreates the schema
+    from app.main import fast_app
+
+    with TestClient(fast_app) as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def charger_ids(client) -> list[str]:
+    return _seed()
@@ -0,0 +1,66 @@
+import json
+import uuid
+
+import app.data_import as data_import
+from app.data_import import ImportFormat
+
+def _write_geojson(path, features: list[dict]):
+    path.write_text(json.dumps({
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": coordinates},
+                "properties": properties
+            } for coordinates, properties in features
+        ]
+    }))
+
+FEATURES = [
+    ([-122.2, 37.8], {"time_zone": "America/Los_Angeles", "charger_price_tier": 3}),
+    ([-122.1, 37.7], {"time_zone": "America/Los_Angeles", "charger_price_tier": 2, "in_use": "true"}),
+    ([-122.0, 37.6], {"time_zone": "Nowhere", "charger_price_tier": 1}),
+]
+
+def test_read_geojson_chunks(tmp_path):
+    path = tmp_path / "chargers.geojson"
+    _write_geojson(path, FEATURES)
+
+    chunks = list(data_import._read_chunks(str(path), ImportFormat.GEOJSON))
+
+    assert len(chunks) == 1
+    assert chunks[0]["longitude"].tolist() == [-122.2, -122.1, -122.0]
+    assert chunks[0]["latitude"].tolist() == [37.8, 37.7, 37.6]
+
+def test_validate_geojson_chunk(tmp_path):
+    path = tmp_path / "chargers.geojson"
+    _write_geojson(path, FEATURES)
+    region_id = uuid.uuid4()
+
+    chunk = next(data_import._read_chunks(str(path), ImportFormat.GEOJSON))
+    rows, errors = data_import._validate_chunk(chunk, 1, region_id)
+
+    assert rows["row_number"].tolist() == [1, 2]
+    assert rows["in_use"].tolist() == [False, True]
+    assert rows["operational"].tolist() == [True, True]
+    assert rows["region_id"].tolist() == [region_id, region_id]
+    assert errors == [(3, "invalid time zone")]
+
+def test_import_geojson(client, charger_ids, tmp_path, monkeypatch):
+    monkeypatch.setattr(data_import, "IMPORT_ROOT", str(tmp_path))
+    _write_geojson(tmp_path / "chargers.geojson", FEATURES)
+    region_id = client.get("/regions").json()["contents"][0]["id"]
+
+    response = client.post("/chargers/import", params={"path": "chargers.geojson", "region_id": region_id})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["row_count"] == 3
+    assert result["imported_count"] == 2
+    assert result["scheduled_count"] == 2
+    assert result["rejected_count"] == 1
+
+    chargers = client.get("/chargers", params={"region_id": region_id, "include_current_price": True}).json()
+    imported = [charger for charger in chargers["contents"] if charger["id"] not in charger_ids]
+    assert len(imported) == 2
+    assert all(charger["current_pricing_period"] for charger in imported)
@@ -0,0 +1,18 @@
+import uuid
+
+def test_export_malformed_region_id(client):
+    response = client.get("/export/chargers", params={"region_id": "not-a-uuid"})
+
+    assert response.status_code == 400
+
+def test_export_unknown_region(client):
+    response = client.get("/export/chargers", params={"region_id": str(uuid.uuid4())})
+
+    assert response.status_code == 404
+
+def test_export_region(client, charger_ids):
+    region_id = client.get(f"/chargers/{charger_ids[0]}").json()["region_id"]
+    response = client.get("/export/chargers", params={"format": "ndjson", "region_id": region_id})
+
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) >= len(charger_ids)
@@ -0,0 +1,62 @@
+from app.utils.sql_tracing import query_budget
+
+# SQL statements allowed per request, whatever the number of chargers or periods returned.
+# A query per charger or per period shows up as a budget overrun listing the statements.
+
+def test_pricing_schedule(client, charger_ids):
+    with query_budget(1):
+        response = client.get(f"/chargers/{charger_ids[0]}/pricing-schedule")
+
+    assert response.status_code == 200
+    assert response.json()["count"] > 0
+
+def test_current_pricing_period(client, charger_ids):
+    with query_budget(1):
+        response = client.get(f"/chargers/{charger_ids[0]}/current-pricing-period")
+
+    assert response.status_code == 200
+
+def test_pricing_periods(client, charger_ids):
+    with query_budget(1):
+        response = client.get(f"/chargers/{charger_ids[0]}/pricing-periods")
+
+    assert response.status_code == 200
+    assert response.json()["count"] > 0
+
+def test_chargers_multi_get(client, charger_ids):
+    with query_budget(1):
+        response = client.get("/chargers/multi", params={"ids": charger_ids})
+
+    assert response.status_code == 200
+    assert response.json()["count"] == len(charger_ids)
+
+def test_chargers_multi_get_with_pricing_schedules(client, charger_ids):
+    with query_budget(2):
+        response = client.get("/chargers/multi", params={"ids": charger_ids, "embed": "pricing_schedule"})
+
+    assert response.status_code == 200
+    assert all(charger["pricing_schedule"] for charger in response.json()["contents"])
+
+def test_chargers_multi_get_with_current_pricing_periods(client, charger_ids):
+    with query_budget(2):
+        response = client.get("/chargers/multi", params={"ids": charger_ids, "embed": "current_pricing_period"})
+
+    assert response.status_code == 200
+    assert all(charger["current_pricing_period"] for charger in response.json()["contents"])
+
+def test_chargers_with_current_price(client, charger_ids):
+    with query_budget(1):
+        response = client.get("/chargers", params={"include_current_price": True})
+
+    assert response.status_code == 200
+    # Other tests may add chargers
+    assert response.json()["count"] >= len(charger_ids)
+    assert all(charger["current_pricing_period"] for charger in response.json()["contents"])
+
+def test_chargers_sorted_by_price(client, charger_ids):
+    with query_budget(1):
+        response = client.get("/chargers", params={"sort_by_price": True})
+
+    assert response.status_code == 200
+    prices = [charger["current_pricing_period"]["price_per_kwh"] for charger in response.json()["contents"]]
+    assert prices == sorted(prices)
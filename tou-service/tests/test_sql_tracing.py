@@ -0,0 +1,125 @@
+import contextvars
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.utils.sql_tracing import QueryBudgetExceeded, install_sql_tracing, query_budget, sql_trace, traced
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    install_sql_tracing(engine)
+    yield engine
+    engine.dispose()
+
+def _select(engine, count: int = 1):
+    with engine.connect() as connection:
+        for _ in range(count):
+            connection.execute(text("SELECT 1"))
+
+def test_sql_trace_records_statements(engine):
+    with sql_trace() as trace:
+        _select(engine, 3)
+
+    assert trace.query_count == 3
+    # SELECT row counts are unknown to the DBAPI until fetched
+    assert trace.row_count == 0
+    assert all(statement.statement == "SELECT 1" for statement in trace.statements)
+
+def test_nothing_recorded_outside_of_traces(engine):
+    with sql_trace() as trace:
+        pass
+    _select(engine)
+
+    assert trace.query_count == 0
+
+def test_nested_traces_record_every_statement_within_them(engine):
+    with sql_trace() as outer:
+        _select(engine)
+        with sql_trace() as inner:
+            _select(engine, 2)
+
+    assert outer.query_count == 3
+    assert inner.query_count == 2
+
+def test_traced_attributes_statements_to_the_innermost_function(engine):
+    @traced
+    def inner():
+        _select(engine)
+
+    @traced
+    def outer():
+        _select(engine)
+        inner()
+        _select(engine)
+
+    with sql_trace() as trace:
+        outer()
+        _select(engine)
+
+    assert [statement.function for statement in trace.statements] == ["outer", "inner", "outer", None]
+    assert trace.query_counts_by_function() == {"outer": 2, "inner": 1, "<unattributed>": 1}
+
+def test_traced_records_outermost_calls_and_their_threads():
+    calling_threads = []
+
+    @traced
+    def inner():
+        calling_threads.append(set(trace.calling_threads))
+
+    @traced
+    def outer():
+        inner()
+
+    with sql_trace() as trace:
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(outer,))
+        thread.start()
+        thread.join()
+
+    assert [call.function for call in trace.calls] == ["outer"]
+    assert trace.calls[0].duration >= 0 and trace.calls[0].cpu_time >= 0
+    assert calling_threads == [{thread.ident}]
+    assert trace.calling_threads == set()
+
+def test_traced_keeps_the_function_metadata():
+    @traced
+    def get_something():
+        """Docstring."""
+
+    assert get_something.__name__ == "get_something"
+    assert get_something.__doc__ == "Docstring."
+
+def test_query_budget_within_budget(engine):
+    with query_budget(2, engine) as trace:
+        _select(engine, 2)
+
+    assert trace.query_count == 2
+
+def test_query_budget_exceeded_lists_the_statements(engine):
+    @traced
+    def n_plus_one():
+        _select(engine, 3)
+
+    with pytest.raises(QueryBudgetExceeded) as exceeded:
+        with query_budget(2, engine):
+            n_plus_one()
+
+    message = str(exceeded.value)
+    assert "3 SQL statements executed, over the budget of 2" in message
+    assert message.count("[n_plus_one] SELECT 1") == 3
+
+def test_query_budget_counts_statements_of_other_threads(engine):
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget(1, engine):
+            _select(engine)
+            thread = threading.Thread(target=_select, args=(engine,))
+            thread.start()
+            thread.join()
+
+def test_query_budget_stops_counting_after_the_block(engine):
+    with query_budget(1, engine) as trace:
+        _select(engine)
+    _select(engine, 2)
+
+    assert trace.query_count == 1